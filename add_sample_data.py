@@ -1,121 +1,264 @@
 #!/usr/bin/env python3
 """
-Add sample data for testing the admin dashboard
+Add sample data for testing the admin dashboard, or generate production-scale
+synthetic data for load testing.
+
+Usage: python add_sample_data.py [--users N] [--items N] [--days N]
+                                 [--orders-per-day N] [--feedback-rate F]
+                                 [--cart-fill F] [--chunk-size N] [--seed N]
+
+Run without arguments for a small demo data set. Examples for load testing:
+
+  python add_sample_data.py --users 5000 --items 80 --days 365 --orders-per-day 3000
+  DATABASE_URL=sqlite:///load.db python add_sample_data.py --days 730 --orders-per-day 5000
+
+Each table is only filled when it is empty, so the script is safe to re-run.
 """
 
-from app import app, db, User, MenuItem, Order, OrderItem, Cart
+import argparse
+import random
+import time
+from datetime import datetime, date, timedelta
+
+from app import (app, db, User, MenuItem, Order, OrderItem, Cart, Feedback, MEAL_SHIFTS,
+                 bump_data_version, rebuild_rating_summaries, rebuild_sales_rollups,
+                 rebuild_user_stats)
 from werkzeug.security import generate_password_hash
 
-def add_sample_data():
+# Share of a day's orders and the hours they are placed in, per meal shift
+SHIFT_PROFILE = {
+    'breakfast': {'share': 0.25, 'hours': (7, 10)},
+    'lunch': {'share': 0.40, 'hours': (12, 15)},
+    'supper': {'share': 0.12, 'hours': (16, 18)},
+    'dinner': {'share': 0.23, 'hours': (19, 22)},
+}
+
+# Dishes used to name generated menu items: (name, description, base price)
+DISHES = {
+    'breakfast': [
+        ('Pancakes', 'Fluffy breakfast pancakes', 5.99),
+        ('Scrambled Eggs', 'Fresh scrambled eggs', 4.50),
+        ('Paratha', 'Flaky flatbread with egg', 3.50),
+        ('Khichuri', 'Rice and lentils with ghee', 4.99),
+    ],
+    'lunch': [
+        ('Chicken Curry', 'Spicy chicken curry with rice', 12.99),
+        ('Grilled Fish', 'Fresh grilled fish with vegetables', 15.99),
+        ('Beef Tehari', 'Spiced rice with beef', 11.50),
+        ('Vegetable Thali', 'Rice, dal and seasonal vegetables', 8.99),
+    ],
+    'supper': [
+        ('Singara', 'Crispy potato pastry', 1.50),
+        ('Chotpoti', 'Tangy chickpea snack', 2.99),
+        ('Vegetable Roll', 'Wrap with spiced vegetables', 3.99),
+    ],
+    'dinner': [
+        ('Beef Steak', 'Premium beef steak', 18.99),
+        ('Pasta Carbonara', 'Creamy pasta with bacon', 11.99),
+        ('Kacchi Biryani', 'Mutton biryani with potatoes', 16.50),
+        ('Dal Makhani', 'Slow cooked black lentils', 9.99),
+    ],
+}
+
+DEMO_ACCOUNTS = [('admin', 'admin123', True), ('john_doe', 'password123', False), ('jane_smith', 'password123', False)]
+
+# Probability weights for the number of lines in an order and the quantity per line
+LINES_PER_ORDER = [1, 2, 3, 4]
+LINES_WEIGHTS = [0.45, 0.35, 0.15, 0.05]
+QUANTITIES = [1, 2, 3]
+QUANTITY_WEIGHTS = [0.8, 0.15, 0.05]
+
+
+def cumulative(weights):
+    """Running totals for random.choices(cum_weights=...), which then picks in O(log n)."""
+    totals, running = [], 0.0
+    for weight in weights:
+        running += weight
+        totals.append(running)
+    return totals
+
+
+def insert_chunk(model, rows):
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+        del rows[:]
+
+
+def create_users(customers):
+    """Demo accounts plus generated customers; all customers share one password hash."""
+    password = generate_password_hash('password123')
+    rows = [{'username': username, 'password': generate_password_hash(secret) if is_admin else password,
+             'is_admin': is_admin} for username, secret, is_admin in DEMO_ACCOUNTS[:1 + customers]]
+    rows += [{'username': 'student%06d' % n, 'password': password, 'is_admin': False}
+             for n in range(1, customers - len(DEMO_ACCOUNTS) + 2)]
+    db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def create_menu_items(count, rng):
+    """Spread count items evenly over the meal shifts, cycling through DISHES for names."""
+    rows = []
+    for n in range(count):
+        shift = MEAL_SHIFTS[n % len(MEAL_SHIFTS)]
+        dishes = DISHES[shift]
+        name, description, price = dishes[(n // len(MEAL_SHIFTS)) % len(dishes)]
+        round_number = n // (len(MEAL_SHIFTS) * len(dishes))
+        if round_number:
+            name = '%s %d' % (name, round_number + 1)
+            price = round(price * rng.uniform(0.9, 1.3), 2)
+        rows.append({'name': name, 'description': description, 'price': price, 'shift': shift, 'available': True})
+    db.session.execute(MenuItem.__table__.insert(), rows)
+    bump_data_version('menu')
+    db.session.commit()
+    return len(rows)
+
+
+def generate_orders(days, orders_per_day, feedback_rate, chunk_size, rng):
+    """Bulk insert order history with its lines and feedback, chunk_size orders per commit."""
+    customer_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.is_admin == False).order_by(User.id)]
+    # A few regulars order far more often than everyone else
+    customer_weights = cumulative([1.0 / (rank + 1) ** 0.6 for rank in range(len(customer_ids))])
+    items_by_shift = {}
+    for item in MenuItem.query.order_by(MenuItem.id):
+        items_by_shift.setdefault(item.shift, []).append(item)
+    shifts = [shift for shift in MEAL_SHIFTS if shift in items_by_shift]
+    shift_weights = cumulative([SHIFT_PROFILE[shift]['share'] for shift in shifts])
+    # Per shift, early menu items are the popular ones, and each item has its own rating tendency
+    item_weights = {shift: cumulative([1.0 / (rank + 1) for rank in range(len(items))])
+                    for shift, items in items_by_shift.items()}
+    item_quality = {item.id: rng.uniform(3.0, 5.0) for items in items_by_shift.values() for item in items}
+
+    order_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+    order_rows, line_rows, feedback_rows = [], [], []
+    totals = {'orders': 0, 'order_items': 0, 'feedback': 0}
+    today = date.today()
+
+    for day_offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=day_offset)
+        volume = orders_per_day * rng.uniform(0.85, 1.15) * (0.4 if day.weekday() >= 5 else 1.0)
+        day_start = datetime(day.year, day.month, day.day)
+
+        for _ in range(int(volume)):
+            shift = rng.choices(shifts, cum_weights=shift_weights)[0]
+            first_hour, last_hour = SHIFT_PROFILE[shift]['hours']
+            placed_at = day_start + timedelta(seconds=rng.randrange(first_hour * 3600, last_hour * 3600))
+            if day_offset == 0:
+                status = rng.choices(['pending', 'completed', 'cancelled'], [0.6, 0.35, 0.05])[0]
+            else:
+                status = 'cancelled' if rng.random() < 0.06 else 'completed'
+            user_id = rng.choices(customer_ids, cum_weights=customer_weights)[0]
+
+            lines = rng.choices(LINES_PER_ORDER, LINES_WEIGHTS)[0]
+            chosen = {item.id: item for item in rng.choices(items_by_shift[shift], cum_weights=item_weights[shift], k=lines)}
+            total = 0.0
+            for item in chosen.values():
+                quantity = rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0]
+                total += quantity * item.price
+                line_rows.append({'order_id': order_id, 'item_id': item.id, 'quantity': quantity, 'unit_price': item.price})
+                if status == 'completed' and rng.random() < feedback_rate:
+                    rating = min(5, max(1, round(rng.gauss(item_quality[item.id], 0.8))))
+                    feedback_rows.append({'user_id': user_id, 'item_id': item.id, 'rating': rating, 'comment': None,
+                                          'timestamp': placed_at + timedelta(hours=1)})
+            order_rows.append({'id': order_id, 'user_id': user_id, 'meal_shift': shift, 'timestamp': placed_at,
+                               'status': status, 'total_amount': round(total, 2)})
+            order_id += 1
+
+            if len(order_rows) >= chunk_size:
+                totals['orders'] += len(order_rows)
+                totals['order_items'] += len(line_rows)
+                totals['feedback'] += len(feedback_rows)
+                insert_chunk(Order, order_rows)
+                insert_chunk(OrderItem, line_rows)
+                insert_chunk(Feedback, feedback_rows)
+                db.session.commit()
+                print(f"   ... {totals['orders']:,} orders up to {day}")
+
+    totals['orders'] += len(order_rows)
+    totals['order_items'] += len(line_rows)
+    totals['feedback'] += len(feedback_rows)
+    insert_chunk(Order, order_rows)
+    insert_chunk(OrderItem, line_rows)
+    insert_chunk(Feedback, feedback_rows)
+    db.session.commit()
+    return totals
+
+
+def fill_carts(cart_fill, rng):
+    """Give a cart_fill share of customers a few items waiting in their cart."""
+    customer_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.is_admin == False)]
+    item_ids = [item_id for (item_id,) in db.session.query(MenuItem.id)]
+    rows = []
+    for user_id in customer_ids:
+        if rng.random() < cart_fill:
+            for item_id in rng.sample(item_ids, min(len(item_ids), rng.randint(1, 5))):
+                rows.append({'user_id': user_id, 'item_id': item_id, 'quantity': rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0],
+                             'timestamp': datetime.utcnow()})
+    insert_chunk(Cart, rows)
+    db.session.commit()
+
+
+def add_sample_data(users=2, items=6, days=7, orders_per_day=4, feedback_rate=0.2, cart_fill=0.0,
+                    chunk_size=5000, seed=None):
     """Add sample data to the database"""
+    rng = random.Random(seed)
     with app.app_context():
         try:
+            started = time.perf_counter()
+
             # Create users if they don't exist
             if User.query.count() == 0:
-                admin = User(
-                    username='admin',
-                    password=generate_password_hash('admin123'),
-                    is_admin=True
-                )
-                user1 = User(
-                    username='john_doe',
-                    password=generate_password_hash('password123'),
-                    is_admin=False
-                )
-                user2 = User(
-                    username='jane_smith',
-                    password=generate_password_hash('password123'),
-                    is_admin=False
-                )
-                
-                db.session.add_all([admin, user1, user2])
-                db.session.commit()
-                print("✅ Sample users created")
-            
+                created = create_users(users)
+                print(f"✅ {created:,} sample users created")
+
             # Create menu items if they don't exist
             if MenuItem.query.count() == 0:
-                menu_items = [
-                    MenuItem(name='Pancakes', description='Fluffy breakfast pancakes', price=5.99, shift='breakfast', available=True),
-                    MenuItem(name='Scrambled Eggs', description='Fresh scrambled eggs', price=4.50, shift='breakfast', available=True),
-                    MenuItem(name='Chicken Curry', description='Spicy chicken curry with rice', price=12.99, shift='lunch', available=True),
-                    MenuItem(name='Grilled Fish', description='Fresh grilled fish with vegetables', price=15.99, shift='lunch', available=True),
-                    MenuItem(name='Beef Steak', description='Premium beef steak', price=18.99, shift='dinner', available=True),
-                    MenuItem(name='Pasta Carbonara', description='Creamy pasta with bacon', price=11.99, shift='dinner', available=True),
-                ]
-                
-                db.session.add_all(menu_items)
-                db.session.commit()
-                print("✅ Sample menu items created")
-            
-            # Create sample orders if they don't exist
+                created = create_menu_items(items, rng)
+                print(f"✅ {created:,} sample menu items created")
+
+            # Create order history if it doesn't exist
             if Order.query.count() == 0:
-                users = User.query.filter(User.is_admin == False).all()
-                menu_items = MenuItem.query.all()
-                
-                if users and menu_items:
-                    # Breakfast order
-                    breakfast_order = Order(
-                        user_id=users[0].id,
-                        meal_shift='breakfast',
-                        total_amount=10.49,
-                        status='completed'
-                    )
-                    db.session.add(breakfast_order)
-                    db.session.flush()
-                    
-                    # Add order items for breakfast
-                    breakfast_items = [
-                        OrderItem(order_id=breakfast_order.id, item_id=menu_items[0].id, quantity=1, unit_price=5.99),  # Pancakes
-                        OrderItem(order_id=breakfast_order.id, item_id=menu_items[1].id, quantity=1, unit_price=4.50),  # Scrambled Eggs
-                    ]
-                    db.session.add_all(breakfast_items)
-                    
-                    # Lunch order
-                    lunch_order = Order(
-                        user_id=users[1].id,
-                        meal_shift='lunch',
-                        total_amount=12.99,
-                        status='pending'
-                    )
-                    db.session.add(lunch_order)
-                    db.session.flush()
-                    
-                    # Add order items for lunch
-                    lunch_items = [
-                        OrderItem(order_id=lunch_order.id, item_id=menu_items[2].id, quantity=1, unit_price=12.99),  # Chicken Curry
-                    ]
-                    db.session.add_all(lunch_items)
-                    
-                    # Dinner order
-                    dinner_order = Order(
-                        user_id=users[0].id,
-                        meal_shift='dinner',
-                        total_amount=30.98,
-                        status='completed'
-                    )
-                    db.session.add(dinner_order)
-                    db.session.flush()
-                    
-                    # Add order items for dinner
-                    dinner_items = [
-                        OrderItem(order_id=dinner_order.id, item_id=menu_items[4].id, quantity=1, unit_price=18.99),  # Beef Steak
-                        OrderItem(order_id=dinner_order.id, item_id=menu_items[5].id, quantity=1, unit_price=11.99),  # Pasta Carbonara
-                    ]
-                    db.session.add_all(dinner_items)
-                    
-                    db.session.commit()
-                    print("✅ Sample orders created")
-            
-            print("\n🎉 Sample data added successfully!")
+                totals = generate_orders(days, orders_per_day, feedback_rate, chunk_size, rng)
+                print(f"✅ {totals['orders']:,} orders with {totals['order_items']:,} order items "
+                      f"and {totals['feedback']:,} reviews created")
+                # Dashboard totals, profile counters and menu ratings are read from summary tables
+                rebuild_sales_rollups()
+                rebuild_user_stats()
+                rebuild_rating_summaries()
+                print("✅ Sales rollups, user stats and rating summaries rebuilt")
+
+            if cart_fill and Cart.query.count() == 0:
+                fill_carts(cart_fill, rng)
+                print(f"✅ {Cart.query.count():,} cart lines created")
+
+            print(f"\n🎉 Sample data added successfully in {time.perf_counter() - started:.1f}s!")
             print("📊 Dashboard now has meaningful data to display")
             print("🔑 Login credentials:")
             print("   Admin: admin / admin123")
             print("   User1: john_doe / password123")
             print("   User2: jane_smith / password123")
-            
+            if users > 2:
+                print("   Generated customers: student000001 ... / password123")
+
         except Exception as e:
             print(f"❌ Error adding sample data: {str(e)}")
             db.session.rollback()
 
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2, help='customer accounts (besides admin)')
+    parser.add_argument('--items', type=int, default=6, help='menu items, spread over the meal shifts')
+    parser.add_argument('--days', type=int, default=7, help='days of order history ending today')
+    parser.add_argument('--orders-per-day', type=int, default=4, help='average orders on a weekday')
+    parser.add_argument('--feedback-rate', type=float, default=0.2, help='share of completed order lines that get reviewed')
+    parser.add_argument('--cart-fill', type=float, default=0.0, help='share of customers with items in their cart')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='orders inserted per transaction')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for reproducible data')
+    args = parser.parse_args()
+    add_sample_data(args.users, args.items, args.days, args.orders_per_day, args.feedback_rate,
+                    args.cart_fill, args.chunk_size, args.seed)
+
+
 if __name__ == '__main__':
-    add_sample_data()
\ No newline at end of file
+    main()
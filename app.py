@@ -1,19 +1,157 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, make_response, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_babel import Babel, gettext, ngettext, lazy_gettext
+from flask_babel import Babel, gettext, ngettext, lazy_gettext, force_locale, get_translations
+from flask_babel import get_locale as get_babel_locale
+from babel.messages.pofile import read_po
+from babel.messages.mofile import read_mo, write_mo
+from markupsafe import Markup
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from PIL import Image, ImageOps, features
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 import os
-from datetime import datetime
+import re
+import time
+import bisect
+import hashlib
+import hmac
+import io
+import json
+import queue
+import threading
+import sqlite3
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime, date, timedelta
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+# Optional: under gunicorn's gevent worker, threads are greenlets and open event streams are cheap
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///canteen.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///canteen.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['ADMIN_ORDERS_PER_PAGE'] = 25
+
+# Resized copies written next to every uploaded image: variant name -> max width in px
+app.config['IMAGE_VARIANTS'] = {'thumb': 160, 'card': 480, 'full': 1200}
+app.config['DEFAULT_FOOD_IMAGE'] = 'static/uploads/default-food.png'
+# Content-addressed uploads never change, so browsers may keep them for a year
+app.config['UPLOAD_CACHE_MAX_AGE'] = 365 * 24 * 60 * 60
+# Server-Sent Events: order events are stored in the order_event table, so every worker
+# process can relay them. Streams stay open only where an idle one holds no thread: under
+# a gevent worker, or when ORDER_EVENTS_KEEP_OPEN=1 (0 forces short requests). Elsewhere
+# each request sends the events the browser missed and ends, and the browser reconnects
+# after ORDER_EVENTS_RECONNECT seconds.
+app.config['ORDER_EVENTS_KEEP_OPEN'] = {'1': True, '0': False}.get(os.environ.get('ORDER_EVENTS_KEEP_OPEN'))
+app.config['ORDER_EVENTS_RECONNECT'] = 5
+# Open streams: seconds between keep-alive comments, events buffered per slow client,
+# streams per process (more get 503), seconds without an event after which a stream
+# ends (browsers reconnect), and seconds between the relay's reads of new events
+app.config['ORDER_EVENTS_HEARTBEAT'] = 15
+app.config['ORDER_EVENTS_BACKLOG'] = 100
+app.config['ORDER_EVENTS_MAX_SUBSCRIBERS'] = int(os.environ.get('ORDER_EVENTS_MAX_SUBSCRIBERS', 1000))
+app.config['ORDER_EVENTS_IDLE_TIMEOUT'] = 300
+app.config['ORDER_EVENTS_POLL_INTERVAL'] = 1
+# Missed events sent per request, and hours events are kept (python manage_db.py archive)
+app.config['ORDER_EVENTS_REPLAY'] = 100
+app.config['ORDER_EVENTS_RETENTION_HOURS'] = 24
+
+# Password hashing: werkzeug method string and salt length for new hashes (existing
+# hashes are upgraded on the next login), how many hashes run at once, how many may
+# wait behind them, and how long a request waits for its turn before giving up.
+# Running and waiting logins each hold a request thread, so keep WORKERS + QUEUE
+# well below the request threads per process or a login spike starves other pages
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 2))
+app.config['PASSWORD_HASH_TIMEOUT'] = 10
+# Prometheus scrapers send "Authorization: Bearer <METRICS_TOKEN>" to read /admin/metrics
+# without an admin session; unset means only logged-in admins can read it
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# SQL statements slower than this are logged with their query plan; the last
+# SLOW_QUERY_LOG_SIZE are kept in memory, and SLOW_QUERY_LOG_FILE (JSON lines) keeps them all
+app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+app.config['SLOW_QUERY_LOG_SIZE'] = 200
+app.config['SLOW_QUERY_LOG_FILE'] = os.environ.get('SLOW_QUERY_LOG_FILE')
+# Logged-in users' id/username/admin flag are cached per process for this many
+# seconds, for at most this many users; update_profile() drops its own entry
+app.config['IDENTITY_CACHE_TTL'] = 60
+app.config['IDENTITY_CACHE_SIZE'] = 1024
+# Archival (python manage_db.py archive): completed and cancelled orders older than
+# ORDER_ARCHIVE_AFTER_DAYS move to the archive tables, ARCHIVE_BATCH_SIZE orders per
+# transaction, and carts nobody has touched for CART_RETENTION_DAYS are deleted
+app.config['ORDER_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+app.config['CART_RETENTION_DAYS'] = int(os.environ.get('CART_RETENTION_DAYS', 14))
+app.config['ARCHIVE_BATCH_SIZE'] = 500
+# Sales reports (/admin/reports/sales) cover at most this many days per request;
+# each worker keeps the serialized reports for this many (range, bucket, shift) keys
+# and the totals of this many days (keep it above SALES_REPORT_MAX_DAYS + 12)
+app.config['SALES_REPORT_MAX_DAYS'] = 400
+app.config['SALES_REPORT_CACHE_SIZE'] = 256
+app.config['SALES_REPORT_DAY_CACHE_SIZE'] = 1830
+
+MEAL_SHIFTS = ['breakfast', 'lunch', 'supper', 'dinner']
+ORDER_STATUSES = ['pending', 'completed', 'cancelled']
+
+# SQLite engine profiles, selected by FLASK_ENV. Any pragma can be overridden
+# with an environment variable such as SQLITE_BUSY_TIMEOUT=30000.
+SQLITE_PROFILES = {
+    'production': {
+        'pool_size': 10,
+        'pragmas': {
+            'journal_mode': 'WAL',       # readers no longer block behind checkout writes
+            'busy_timeout': 15000,       # ms to wait for a lock before "database is locked"
+            'synchronous': 'NORMAL',     # durable enough with WAL, far fewer fsyncs
+            'mmap_size': 268435456,      # 256MB memory-mapped reads
+            'cache_size': -65536,        # 64MB page cache per connection
+            'temp_store': 'MEMORY'
+        }
+    },
+    'development': {
+        'pool_size': 5,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,
+            'synchronous': 'NORMAL',
+            'mmap_size': 67108864,
+            'cache_size': -16384,
+            'temp_store': 'MEMORY'
+        }
+    },
+    'testing': {
+        'pool_size': 2,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 1000,
+            'synchronous': 'OFF',
+            'cache_size': -8192,
+            'temp_store': 'MEMORY'
+        }
+    }
+}
+sqlite_profile = SQLITE_PROFILES.get(app.config['ENV'], SQLITE_PROFILES['production'])
+app.config['SQLITE_PRAGMAS'] = {
+    name: os.environ.get('SQLITE_' + name.upper(), value)
+    for name, value in sqlite_profile['pragmas'].items()
+}
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///') and ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    # Keep tuned connections open instead of reconnecting (and re-applying pragmas) per request
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': QueuePool,
+        'pool_size': sqlite_profile['pool_size'],
+        'connect_args': {'check_same_thread': False}
+    }
 
 # Babel configuration
 app.config['LANGUAGES'] = {
@@ -56,21 +194,35 @@ class Order(db.Model):
     
     # Relationships
     order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    # Indexes backing the keyset-paginated admin order list and its filters,
+    # and each customer's newest-first order history. AUTOINCREMENT keeps SQLite
+    # from reusing the ids of orders that were moved to the archive.
+    __table_args__ = (
+        db.Index('ix_order_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_order_status_timestamp_id', 'status', 'timestamp', 'id'),
+        db.Index('ix_order_meal_shift_timestamp_id', 'meal_shift', 'timestamp', 'id'),
+        db.Index('ix_order_user_id_timestamp', 'user_id', 'timestamp'),
+        {'sqlite_autoincrement': True},
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)  # Price at time of order
     
     # Relationships  
     item = db.relationship('MenuItem', backref='order_items', lazy=True)
+    
+    # Archived order lines keep their ids, so SQLite must never hand them out again
+    __table_args__ = {'sqlite_autoincrement': True}
 
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False, index=True)
     rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
     comment = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -79,7 +231,7 @@ class Notice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -95,44 +247,1371 @@ class Cart(db.Model):
     # Unique constraint to prevent duplicate items in cart
     __table_args__ = (db.UniqueConstraint('user_id', 'item_id', name='_user_item_cart'),)
 
+class ArchivedOrder(db.Model):
+    # Completed and cancelled orders moved out of the order table by
+    # archive_orders(); same columns and ids as Order
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    meal_shift = db.Column(db.String(20), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    
+    # Relationships
+    order_items = db.relationship('ArchivedOrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.Index('ix_archived_order_user_id_timestamp', 'user_id', 'timestamp'),)
+
+class ArchivedOrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('archived_order.id'), nullable=False, index=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    
+    # Relationships
+    item = db.relationship('MenuItem', lazy=True)
+
+class RatingSummary(db.Model):
+    # Running totals per menu item, maintained alongside every Feedback insert
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Relationships
+    item = db.relationship('MenuItem', backref=db.backref('rating_summary', uselist=False, cascade='all, delete-orphan'))
+    
+    @property
+    def average(self):
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
+    
+    @property
+    def histogram(self):
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+class SalesRollup(db.Model):
+    # Order counts and revenue per day, meal shift and order status
+    day = db.Column(db.Date, primary_key=True)
+    meal_shift = db.Column(db.String(20), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class ItemSalesRollup(db.Model):
+    # Quantities sold per day, meal shift and menu item
+    day = db.Column(db.Date, primary_key=True)
+    meal_shift = db.Column(db.String(20), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class SalesTotal(db.Model):
+    # All-time order counts and revenue per order status, maintained alongside the
+    # rollups so the dashboard never sums the whole rollup history
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class ItemSalesTotal(db.Model):
+    # All-time quantities sold per menu item, maintained alongside the rollups
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    
+    __table_args__ = (db.Index('ix_item_sales_total_quantity', 'quantity'),)
+
+class SalesDayVersion(db.Model):
+    # Change counter per day, bumped in the same transaction as every rollup change
+    # for that day, so cached sales report days are only recomputed when they changed
+    day = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class UserStats(db.Model):
+    # Order counters per customer, maintained alongside every order insert and
+    # status change; total_spent sums the customer's completed orders
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Float, nullable=False, default=0.0)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('stats', uselist=False, cascade='all, delete-orphan'))
+
+class DataVersion(db.Model):
+    # Change counter per data set ('menu', 'notices'), bumped in the same
+    # transaction as every write that changes the cached pages
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class OrderEvent(db.Model):
+    # Order events for the Server-Sent Events streams, written in the same transaction
+    # as the change they describe. Ids are the streams' event ids, so they are never reused.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    event = db.Column(db.String(20), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    __table_args__ = (db.Index('ix_order_event_user_id_id', 'user_id', 'id'), {'sqlite_autoincrement': True})
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+    cursor.close()
+
+# How SQLite reports pragma values that are configured by name
+SQLITE_PRAGMA_VALUES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2}
+}
+
+def sqlite_pragma_report():
+    """Return {pragma: (configured, effective)} for the configured SQLite pragmas."""
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+    report = {}
+    with db.engine.connect() as connection:
+        for name, configured in app.config['SQLITE_PRAGMAS'].items():
+            effective = connection.exec_driver_sql('PRAGMA %s' % name).scalar()
+            report[name] = (configured, effective)
+    return report
+
+def check_sqlite_pragmas():
+    """Log the effective pragmas and warn about any the database did not accept."""
+    for name, (configured, effective) in sqlite_pragma_report().items():
+        expected = SQLITE_PRAGMA_VALUES.get(name, {}).get(str(configured).upper(), configured)
+        if str(expected).lower() != str(effective).lower():
+            app.logger.warning('SQLite pragma %s is %s, configured %s', name, effective, configured)
+        else:
+            app.logger.info('SQLite pragma %s = %s', name, effective)
+
 with app.app_context():
     db.create_all()
+    check_sqlite_pragmas()
+
+# Counter table helpers
+def upsert_statement(model, key_columns, add_columns=(), replace_columns=()):
+    """INSERT that, when a row with the same keys exists, adds add_columns onto it
+    and overwrites replace_columns instead of failing."""
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        new_values = stmt.inserted
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        new_values = stmt.excluded
+    updates = {name: table.c[name] + new_values[name] for name in add_columns}
+    updates.update({name: new_values[name] for name in replace_columns})
+    if dialect == 'mysql':
+        return stmt.on_duplicate_key_update(**updates)
+    return stmt.on_conflict_do_update(index_elements=list(key_columns), set_=updates)
+
+def bump_counters_many(model, key_columns, rows):
+    """Add each row's counter values onto the row with the same keys, creating
+    missing rows, in a single statement (the caller commits)."""
+    if not rows:
+        return
+    counter_columns = [name for name in rows[0] if name not in key_columns]
+    db.session.execute(upsert_statement(model, key_columns, add_columns=counter_columns), rows)
+
+def bump_counters(model, keys, **deltas):
+    """Add deltas to the counter row identified by keys, creating it if needed."""
+    bump_counters_many(model, list(keys), [dict(keys, **deltas)])
+
+# Rating summary helpers
+def record_rating(item_id, rating):
+    """Fold one new rating into the item's summary row (the caller commits)."""
+    bump_counters(RatingSummary, {'item_id': item_id},
+                  rating_sum=rating, rating_count=1, **{'stars_%d' % rating: 1})
+
+def rebuild_rating_summaries():
+    """Recompute every RatingSummary row from the Feedback table."""
+    RatingSummary.query.delete()
+    star_counts = [db.func.sum(db.case((Feedback.rating == stars, 1), else_=0)) for stars in range(1, 6)]
+    totals = db.session.query(
+        Feedback.item_id,
+        db.func.sum(Feedback.rating),
+        db.func.count(Feedback.id),
+        *star_counts
+    ).group_by(Feedback.item_id)
+    db.session.execute(RatingSummary.__table__.insert().from_select(
+        ['item_id', 'rating_sum', 'rating_count', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5'],
+        totals
+    ))
+    bump_data_version('menu')
+    db.session.commit()
+    return RatingSummary.query.count()
+
+def apply_rating_summary(item, summary):
+    """Expose average_rating/total_ratings on a MenuItem for the templates."""
+    item.average_rating = summary.average if summary else 0
+    item.total_ratings = summary.rating_count if summary else 0
+    return item
+
+# Sales rollup helpers
+def record_orders_placed(user_id, placed_at, lines):
+    """Count newly placed pending orders in the rollups and the customer's stats.
+    
+    lines are (meal_shift, item_id, quantity, unit_price) tuples; checkout
+    creates one order per meal shift.
+    """
+    day = placed_at.date()
+    order_totals = {}
+    item_rows = []
+    for meal_shift, item_id, quantity, unit_price in lines:
+        order_totals[meal_shift] = order_totals.get(meal_shift, 0) + quantity * unit_price
+        item_rows.append({'day': day, 'meal_shift': meal_shift, 'item_id': item_id,
+                          'quantity': quantity, 'revenue': quantity * unit_price})
+    bump_counters_many(SalesRollup, ['day', 'meal_shift', 'status'], [
+        {'day': day, 'meal_shift': meal_shift, 'status': 'pending', 'order_count': 1, 'revenue': total}
+        for meal_shift, total in order_totals.items()
+    ])
+    bump_counters_many(ItemSalesRollup, ['day', 'meal_shift', 'item_id'], item_rows)
+    bump_counters(SalesDayVersion, {'day': day}, version=1)
+    bump_counters(SalesTotal, {'status': 'pending'}, order_count=len(order_totals), revenue=sum(order_totals.values()))
+    bump_counters_many(ItemSalesTotal, ['item_id'], [
+        {'item_id': row['item_id'], 'quantity': row['quantity'], 'revenue': row['revenue']} for row in item_rows
+    ])
+    bump_counters(UserStats, {'user_id': user_id}, order_count=len(order_totals), pending_count=len(order_totals))
+
+def record_status_change(order, old_status, new_status):
+    """Move an order between status buckets of its day/shift rollup and its customer's stats."""
+    if old_status == new_status:
+        return
+    keys = {'day': order.timestamp.date(), 'meal_shift': order.meal_shift}
+    bump_counters(SalesRollup, dict(keys, status=old_status), order_count=-1, revenue=-order.total_amount)
+    bump_counters(SalesRollup, dict(keys, status=new_status), order_count=1, revenue=order.total_amount)
+    bump_counters(SalesDayVersion, {'day': keys['day']}, version=1)
+    bump_counters(SalesTotal, {'status': old_status}, order_count=-1, revenue=-order.total_amount)
+    bump_counters(SalesTotal, {'status': new_status}, order_count=1, revenue=order.total_amount)
+    spent = order.total_amount * ((new_status == 'completed') - (old_status == 'completed'))
+    bump_counters(UserStats, {'user_id': order.user_id}, total_spent=spent,
+                  **{'%s_count' % old_status: -1, '%s_count' % new_status: 1})
+
+def order_history():
+    """(orders, order_items): hot and archived rows as two subqueries with the Order/OrderItem columns."""
+    orders = db.union_all(db.select(Order.__table__), db.select(ArchivedOrder.__table__)).subquery('all_orders')
+    items = db.union_all(db.select(OrderItem.__table__), db.select(ArchivedOrderItem.__table__)).subquery('all_order_items')
+    return orders, items
+
+def rebuild_sales_rollups():
+    """Recompute the rollup and all-time total rows from the order history, archive included."""
+    SalesRollup.query.delete()
+    ItemSalesRollup.query.delete()
+    SalesTotal.query.delete()
+    ItemSalesTotal.query.delete()
+    orders, items = order_history()
+    day = db.func.date(orders.c.timestamp)
+    order_totals = db.session.query(
+        day,
+        orders.c.meal_shift,
+        orders.c.status,
+        db.func.count(db.distinct(orders.c.id)),
+        db.func.coalesce(db.func.sum(items.c.quantity * items.c.unit_price), 0)
+    ).outerjoin(items, orders.c.id == items.c.order_id)\
+     .group_by(day, orders.c.meal_shift, orders.c.status)
+    db.session.execute(SalesRollup.__table__.insert().from_select(
+        ['day', 'meal_shift', 'status', 'order_count', 'revenue'], order_totals
+    ))
+    item_totals = db.session.query(
+        day,
+        orders.c.meal_shift,
+        items.c.item_id,
+        db.func.sum(items.c.quantity),
+        db.func.sum(items.c.quantity * items.c.unit_price)
+    ).select_from(items).join(orders, orders.c.id == items.c.order_id)\
+     .group_by(day, orders.c.meal_shift, items.c.item_id)
+    db.session.execute(ItemSalesRollup.__table__.insert().from_select(
+        ['day', 'meal_shift', 'item_id', 'quantity', 'revenue'], item_totals
+    ))
+    db.session.execute(SalesTotal.__table__.insert().from_select(
+        ['status', 'order_count', 'revenue'],
+        db.session.query(SalesRollup.status, db.func.sum(SalesRollup.order_count), db.func.sum(SalesRollup.revenue))
+        .group_by(SalesRollup.status)
+    ))
+    db.session.execute(ItemSalesTotal.__table__.insert().from_select(
+        ['item_id', 'quantity', 'revenue'],
+        db.session.query(ItemSalesRollup.item_id, db.func.sum(ItemSalesRollup.quantity),
+                         db.func.sum(ItemSalesRollup.revenue))
+        .group_by(ItemSalesRollup.item_id)
+    ))
+    # Any day may have changed, so cached sales reports recompute every one of them
+    days = {row[0] for row in db.session.query(SalesRollup.day).distinct()}
+    days.update(row[0] for row in db.session.query(SalesDayVersion.day))
+    bump_counters_many(SalesDayVersion, ['day'], [{'day': day, 'version': 1} for day in sorted(days)])
+    db.session.commit()
+    return SalesRollup.query.count()
+
+# User statistics helpers
+def user_stats_totals():
+    """Query for every customer's UserStats values, computed from their orders, archive included."""
+    orders, _ = order_history()
+    status_counts = [db.func.sum(db.case((orders.c.status == status, 1), else_=0)) for status in ORDER_STATUSES]
+    return db.session.query(
+        orders.c.user_id,
+        db.func.count(orders.c.id),
+        *status_counts,
+        db.func.coalesce(db.func.sum(db.case((orders.c.status == 'completed', orders.c.total_amount), else_=0)), 0)
+    ).group_by(orders.c.user_id)
+
+def rebuild_user_stats():
+    """Recompute every UserStats row from the orders; returns (customers, rows that were wrong)."""
+    columns = ['user_id', 'order_count'] + ['%s_count' % status for status in ORDER_STATUSES] + ['total_spent']
+    
+    def comparable(values):
+        return tuple(values[:-1]) + (round(values[-1], 2),)
+    
+    expected = {row[0]: comparable(row[1:]) for row in user_stats_totals()}
+    current = {row[0]: comparable(row[1:]) for row in db.session.query(*[UserStats.__table__.c[name] for name in columns])}
+    wrong = sum(1 for user_id in expected.keys() | current.keys() if expected.get(user_id) != current.get(user_id))
+    
+    UserStats.query.delete()
+    db.session.execute(UserStats.__table__.insert().from_select(columns, user_stats_totals()))
+    db.session.commit()
+    return len(expected), wrong
+
+# Sales report helpers
+SALES_REPORT_BUCKETS = {'day': 1, 'week': 7}
+SALES_REPORT_FIELDS = ['orders'] + ORDER_STATUSES + ['revenue', 'items']
+
+# Both least recently used first, and only touched while holding _sales_report_lock
+# day -> (its SalesDayVersion when computed, {meal_shift: totals})
+_sales_day_cache = OrderedDict()
+# (start, end, bucket, shift) -> (day versions, ETag, serialized JSON body)
+_sales_report_cache = OrderedDict()
+_sales_report_lock = threading.Lock()
+
+def store_lru(cache, key, value, size):
+    """Store value as the most recently used entry, evicting the oldest beyond size."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+def sales_day_versions(start, end):
+    """((day, version), ...) for every day between start and end that ever changed."""
+    return tuple(db.session.query(SalesDayVersion.day, SalesDayVersion.version)
+                 .filter(SalesDayVersion.day.between(start, end))
+                 .order_by(SalesDayVersion.day))
+
+def load_sales_days(start, end):
+    """{day: {meal_shift: totals}} for start..end, in one grouped pass over both rollups."""
+    def zero(name):
+        return db.literal_column('0').label(name)
+
+    rows = db.union_all(
+        db.select(
+            SalesRollup.day, SalesRollup.meal_shift, SalesRollup.order_count.label('orders'),
+            *[db.case((SalesRollup.status == status, SalesRollup.order_count), else_=0).label(status)
+              for status in ORDER_STATUSES],
+            db.case((SalesRollup.status != 'cancelled', SalesRollup.revenue), else_=0).label('revenue'),
+            zero('items')
+        ).where(SalesRollup.day.between(start, end)),
+        db.select(
+            ItemSalesRollup.day, ItemSalesRollup.meal_shift, zero('orders'),
+            *[zero(status) for status in ORDER_STATUSES], zero('revenue'), ItemSalesRollup.quantity.label('items')
+        ).where(ItemSalesRollup.day.between(start, end))
+    ).subquery('sales_rows')
+    totals = db.session.query(
+        rows.c.day, rows.c.meal_shift, *[db.func.sum(rows.c[field]) for field in SALES_REPORT_FIELDS]
+    ).group_by(rows.c.day, rows.c.meal_shift)
+
+    days = {}
+    for row in totals:
+        day = row[0] if isinstance(row[0], date) else date.fromisoformat(row[0])
+        days.setdefault(day, {})[row[1]] = dict(zip(SALES_REPORT_FIELDS, row[2:]))
+    return days
+
+def cached_sales_days(start, end, versions):
+    """{day: {meal_shift: totals}} for start..end, recomputing only days whose version moved."""
+    changed = dict(versions)
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    sales_days = {}
+    stale = []
+    with _sales_report_lock:
+        for day in days:
+            cached = _sales_day_cache.get(day)
+            if cached and cached[0] == changed.get(day, 0):
+                _sales_day_cache.move_to_end(day)
+                sales_days[day] = cached[1]
+            else:
+                stale.append(day)
+    if stale:
+        fresh = load_sales_days(stale[0], stale[-1])
+        with _sales_report_lock:
+            for day in stale:
+                sales_days[day] = fresh.get(day, {})
+                store_lru(_sales_day_cache, day, (changed.get(day, 0), sales_days[day]),
+                          app.config['SALES_REPORT_DAY_CACHE_SIZE'])
+    return sales_days
+
+def serialize_sales_report(start, end, bucket, shift, versions):
+    """Compact JSON with one entry per bucket, split by meal shift, plus range totals."""
+    shifts = [shift] if shift else MEAL_SHIFTS
+    sales_days = cached_sales_days(start, end, versions)
+
+    def empty():
+        return dict.fromkeys(SALES_REPORT_FIELDS, 0)
+
+    def add(totals, values):
+        for field in SALES_REPORT_FIELDS:
+            totals[field] += values.get(field) or 0
+
+    span = SALES_REPORT_BUCKETS[bucket]
+    buckets = []
+    overall = empty()
+    for offset in range(0, (end - start).days + 1, span):
+        bucket_start = start + timedelta(days=offset)
+        by_shift = {name: empty() for name in shifts}
+        for day in range(span):
+            for name, values in sales_days[bucket_start + timedelta(days=day)].items():
+                if name in by_shift:
+                    add(by_shift[name], values)
+        totals = empty()
+        for values in by_shift.values():
+            values['revenue'] = round(values['revenue'], 2)
+            add(totals, values)
+        add(overall, totals)
+        totals['revenue'] = round(totals['revenue'], 2)
+        buckets.append(dict(totals, start=bucket_start.isoformat(),
+                            end=(bucket_start + timedelta(days=span - 1)).isoformat(), shifts=by_shift))
+    overall['revenue'] = round(overall['revenue'], 2)
+    payload = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'shift': shift,
+        'totals': overall,
+        'buckets': buckets
+    }
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+# Archival helpers
+# Orders in these states never change again, so they can leave the hot table
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+
+def archive_orders(older_than_days=None, batch_size=None):
+    """Move finished orders placed more than older_than_days ago, with their lines,
+    into the archive tables, one transaction per batch; returns how many moved."""
+    if older_than_days is None:
+        older_than_days = app.config['ORDER_ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        order_ids = [order_id for (order_id,) in db.session.query(Order.id)
+                     .filter(Order.status.in_(ARCHIVABLE_STATUSES), Order.timestamp < cutoff)
+                     .order_by(Order.timestamp, Order.id).limit(batch_size)]
+        if not order_ids:
+            return moved
+        db.session.execute(ArchivedOrder.__table__.insert().from_select(
+            [column.name for column in Order.__table__.columns],
+            db.select(Order.__table__).where(Order.id.in_(order_ids))
+        ))
+        db.session.execute(ArchivedOrderItem.__table__.insert().from_select(
+            [column.name for column in OrderItem.__table__.columns],
+            db.select(OrderItem.__table__).where(OrderItem.order_id.in_(order_ids))
+        ))
+        OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(order_ids)
+
+def prune_stale_carts(older_than_days=None, batch_size=None):
+    """Delete the carts of customers who haven't touched theirs for older_than_days;
+    returns how many cart lines were removed."""
+    if older_than_days is None:
+        older_than_days = app.config['CART_RETENTION_DAYS']
+    batch_size = batch_size or app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    removed = 0
+    while True:
+        user_ids = [user_id for (user_id,) in db.session.query(Cart.user_id)
+                    .group_by(Cart.user_id).having(db.func.max(Cart.timestamp) < cutoff).limit(batch_size)]
+        if not user_ids:
+            return removed
+        removed += Cart.query.filter(Cart.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+# Upload image helpers
+# Variant file extension -> (Pillow format, save options). WebP is skipped when
+# Pillow was built without libwebp.
+IMAGE_VARIANT_FORMATS = {'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+if features.check('webp'):
+    IMAGE_VARIANT_FORMATS['webp'] = ('WEBP', {'quality': 80, 'method': 4})
+
+# image_path -> (variant URLs, when to look on disk again). Images without variants
+# are looked for again after IMAGE_VARIANT_RECHECK seconds, or as soon as a cached
+# menu page is rebuilt, in case `python manage_db.py image-variants` generated them
+# in another process
+_image_variant_cache = {}
+IMAGE_VARIANT_RECHECK = 300
+
+# Static filename of a content-addressed upload or one of its variants: uploads/<sha256>[_<variant>].<ext>
+HASHED_UPLOAD_RE = re.compile(r'^uploads/([0-9a-f]{64}(?:_[a-z]+)?)\.[a-z0-9]+$')
+
+def image_variant_path(image_path, variant, ext):
+    return '%s_%s.%s' % (os.path.splitext(image_path)[0], variant, ext)
+
+def generate_image_variants(image_path):
+    """Write resized JPEG/WebP copies of an uploaded image alongside the original."""
+    with Image.open(os.path.join(app.root_path, image_path)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        # JPEG has no alpha channel, so flatten transparent images onto white
+        flattened = Image.new('RGB', original.size, (255, 255, 255))
+        flattened.paste(original, mask=original.split()[3] if original.mode == 'RGBA' else None)
+        
+        for variant, max_width in app.config['IMAGE_VARIANTS'].items():
+            width = min(max_width, original.width)
+            height = max(1, round(original.height * width / original.width))
+            for ext, (image_format, save_options) in IMAGE_VARIANT_FORMATS.items():
+                source = flattened if image_format == 'JPEG' else original
+                resized = source.resize((width, height), Image.LANCZOS) if width != original.width else source
+                resized.save(os.path.join(app.root_path, image_variant_path(image_path, variant, ext)),
+                             image_format, **save_options)
+    _image_variant_cache.pop(image_path, None)
+
+def remove_image_files(image_path):
+    """Delete an uploaded image and all of its variants."""
+    paths = [image_path] + [image_variant_path(image_path, variant, ext)
+                            for variant in app.config['IMAGE_VARIANTS'] for ext in IMAGE_VARIANT_FORMATS]
+    for path in paths:
+        full_path = os.path.join(app.root_path, path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+    _image_variant_cache.pop(image_path, None)
+
+def save_uploaded_image(image):
+    """Store an upload under its content hash with its resized variants; returns its image_path.
+    Raises ValueError for files Pillow cannot read, without leaving anything on disk."""
+    data = image.read()
+    try:
+        with Image.open(io.BytesIO(data)) as upload:
+            upload.verify()
+    except Exception:
+        raise ValueError('The uploaded file is not a valid image')
+    extension = os.path.splitext(secure_filename(image.filename))[1].lower()
+    image_path = '%s/%s%s' % (app.config['UPLOAD_FOLDER'], hashlib.sha256(data).hexdigest(), extension)
+    full_path = os.path.join(app.root_path, image_path)
+    # Identical images share one file; write to a temp name so a half-written
+    # upload is never visible under its hash
+    created = not os.path.exists(full_path)
+    if created:
+        temp_path = '%s.%d.tmp' % (full_path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, full_path)
+    if not os.path.exists(os.path.join(app.root_path, image_variant_path(image_path, 'card', 'jpg'))):
+        try:
+            generate_image_variants(image_path)
+        except Exception:
+            # verify() doesn't decode the pixels, so a truncated file can still fail here
+            if created:
+                remove_image_files(image_path)
+            raise ValueError('The uploaded file is not a valid image')
+    return image_path
+
+def release_uploaded_image(image_path):
+    """Delete an upload and its variants once no menu item references it; call after commit."""
+    if not image_path or image_path == app.config['DEFAULT_FOOD_IMAGE']:
+        return
+    if MenuItem.query.filter_by(image_path=image_path).count() == 0:
+        remove_image_files(image_path)
+
+def discard_uploaded_image(image_path):
+    """Undo save_uploaded_image() after a failed commit: the upload is deleted
+    unless a committed menu item already referenced the same file."""
+    db.session.rollback()
+    if image_path:
+        release_uploaded_image(image_path)
+
+@app.after_request
+def cache_hashed_uploads(response):
+    """Serve content-addressed uploads with an immutable far-future Cache-Control and a content ETag."""
+    if request.endpoint != 'static' or response.status_code not in (200, 304):
+        return response
+    match = HASHED_UPLOAD_RE.match(request.view_args.get('filename', ''))
+    if match:
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['UPLOAD_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        response.set_etag(match.group(1))
+        response.make_conditional(request)
+    return response
+
+@app.template_global()
+def image_variants(image_path):
+    """Return {'src', 'jpg', 'webp'} URLs/srcsets for an image, falling back to
+    the original file when its variants have not been generated."""
+    image_path = image_path or app.config['DEFAULT_FOOD_IMAGE']
+    cached = _image_variant_cache.get(image_path)
+    if cached and (cached[1] is None or cached[1] > time.monotonic()):
+        return cached[0]
+    
+    if not os.path.exists(os.path.join(app.root_path, image_variant_path(image_path, 'card', 'jpg'))):
+        fallback = {'src': '/' + image_path, 'jpg': None, 'webp': None}
+        _image_variant_cache[image_path] = (fallback, time.monotonic() + IMAGE_VARIANT_RECHECK)
+        return fallback
+    
+    srcsets = {}
+    for ext in ('jpg', 'webp'):
+        if ext in IMAGE_VARIANT_FORMATS and os.path.exists(
+                os.path.join(app.root_path, image_variant_path(image_path, 'card', ext))):
+            srcsets[ext] = ', '.join('/%s %dw' % (image_variant_path(image_path, variant, ext), width)
+                                     for variant, width in app.config['IMAGE_VARIANTS'].items())
+        else:
+            srcsets[ext] = None
+    variants = {'src': '/' + image_variant_path(image_path, 'card', 'jpg'), **srcsets}
+    _image_variant_cache[image_path] = (variants, None)
+    return variants
+
+def forget_missing_image_variants():
+    """Look on disk again for images that had no variants the last time they were rendered."""
+    for image_path, (_, recheck_at) in list(_image_variant_cache.items()):
+        if recheck_at is not None:
+            _image_variant_cache.pop(image_path, None)
+
+def generate_missing_image_variants():
+    """Backfill variants for every menu image (and the default image) that lacks them."""
+    image_paths = {path for (path,) in db.session.query(MenuItem.image_path).filter(MenuItem.image_path != None)}
+    image_paths.add(app.config['DEFAULT_FOOD_IMAGE'])
+    generated = 0
+    for image_path in sorted(image_paths):
+        if not os.path.exists(os.path.join(app.root_path, image_path)):
+            continue
+        if not os.path.exists(os.path.join(app.root_path, image_variant_path(image_path, 'card', 'jpg'))):
+            generate_image_variants(image_path)
+            generated += 1
+    if generated:
+        # Cached menu pages still link the original images
+        bump_data_version('menu')
+        db.session.commit()
+    return generated
 
 # Babel locale selector
 @babel.localeselector
-def get_locale():
+def select_locale():
+    # Only configured languages are accepted, so a bad ?lang= can't break
+    # rendering or add entries to the page caches
     # 1. Check if language is set in session
-    if 'language' in session:
+    if session.get('language') in app.config['LANGUAGES']:
         return session['language']
     # 2. Check if language is provided in request args
-    if request.args.get('lang'):
+    if request.args.get('lang') in app.config['LANGUAGES']:
         session['language'] = request.args.get('lang')
         return session['language']
     # 3. Fall back to browser's preferred language
     return request.accept_languages.best_match(app.config['LANGUAGES'].keys()) or app.config['BABEL_DEFAULT_LOCALE']
 
+def get_locale():
+    """Language code of the current request; Flask-Babel resolves it once per request."""
+    return str(get_babel_locale())
+
+def cache_locale():
+    """get_locale() as one of the configured LANGUAGES, for use in cache keys."""
+    locale = get_locale()
+    return locale if locale in app.config['LANGUAGES'] else app.config['BABEL_DEFAULT_LOCALE']
+
 # Language context processor
 @app.context_processor
 def inject_conf_vars():
     return {
         'LANGUAGES': app.config['LANGUAGES'],
-        'CURRENT_LANGUAGE': session.get('language', get_locale()),
+        'CURRENT_LANGUAGE': get_locale(),
         '_': gettext
     }
 
+# Translation catalogs
+# translations/<code>/LC_MESSAGES/messages.po is the source; the .mo next to it is
+# what Flask-Babel loads, compiled by `python manage_db.py translations`
+def translation_catalog_path(code, extension):
+    directory = next(iter(babel.translation_directories))
+    return os.path.join(directory, code, 'LC_MESSAGES', '%s.%s' % (app.config['BABEL_DOMAIN'], extension))
+
+def stale_translation_catalogs():
+    """Languages whose compiled .mo is missing or no longer matches their .po."""
+    stale = []
+    for code in app.config['LANGUAGES']:
+        po_path, mo_path = translation_catalog_path(code, 'po'), translation_catalog_path(code, 'mo')
+        if not os.path.exists(po_path):
+            continue
+        if not os.path.exists(mo_path):
+            stale.append(code)
+            continue
+        with open(po_path, 'rb') as po_file, open(mo_path, 'rb') as mo_file:
+            source, compiled = read_po(po_file, locale=code), read_mo(mo_file)
+        if {m.id: m.string for m in source if m.id and m.string} != {m.id: m.string for m in compiled if m.id}:
+            stale.append(code)
+    return stale
+
+def compile_translations():
+    """Compile every language's .po catalog to .mo; returns the compiled language codes."""
+    compiled = []
+    for code in app.config['LANGUAGES']:
+        po_path = translation_catalog_path(code, 'po')
+        if not os.path.exists(po_path):
+            continue
+        with open(po_path, 'rb') as po_file:
+            catalog = read_po(po_file, locale=code)
+        with open(translation_catalog_path(code, 'mo'), 'wb') as mo_file:
+            write_mo(mo_file, catalog)
+        compiled.append(code)
+    return compiled
+
+def preload_translations():
+    """Load every language's catalog at startup, so no request reads .mo files."""
+    for code in stale_translation_catalogs():
+        app.logger.warning('Compiled translations for %s are out of date; run python manage_db.py translations', code)
+    for code in app.config['LANGUAGES']:
+        with app.test_request_context(), force_locale(code):
+            get_translations()
+
+# Password hashing
+# PBKDF2 runs in a small pool so a login spike can only occupy PASSWORD_HASH_WORKERS
+# cores; hashlib releases the GIL while hashing, so other requests keep running.
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing queue is full."""
+
+_password_pool = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                    thread_name_prefix='password-hash')
+_password_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_QUEUE'])
+
+def run_password_job(func, *args):
+    """Run func in the hashing pool and wait for it, or raise PasswordHashingBusy if the queue is full."""
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = _password_pool.submit(func, *args)
+    except Exception:
+        _password_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_slots.release())
+    try:
+        return future.result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    except FuturesTimeoutError:
+        raise PasswordHashingBusy()
+
+def hash_password(password):
+    return run_password_job(generate_password_hash, password,
+                            app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_SALT_LENGTH'])
+
+def verify_password(pwhash, password):
+    return run_password_job(check_password_hash, pwhash, password)
+
+def password_needs_rehash(pwhash):
+    """True when a stored hash was made with other parameters than the configured ones."""
+    if pwhash.count('$') < 2:
+        return True
+    method, salt, _ = pwhash.split('$', 2)
+    return method != app.config['PASSWORD_HASH_METHOD'] or len(salt) != app.config['PASSWORD_SALT_LENGTH']
+
+# Cart badge count, cached in the session so rendering a page doesn't COUNT the cart.
+# cart_touched (UTC epoch seconds) is when the cart last changed: once that is older
+# than CART_RETENTION_DAYS, prune_stale_carts() may have deleted it, so it is recounted
+def get_cart_count():
+    stale_before = time.time() - app.config['CART_RETENTION_DAYS'] * 24 * 60 * 60
+    if 'cart_count' not in session or (session['cart_count'] and (session.get('cart_touched') or 0) < stale_before):
+        count, touched = db.session.query(db.func.count(Cart.id), db.func.max(Cart.timestamp))\
+            .filter(Cart.user_id == session['user_id']).one()
+        session['cart_count'] = count
+        session['cart_touched'] = (touched - datetime(1970, 1, 1)).total_seconds() if touched else 0
+    return session['cart_count']
+
+def set_cart_count(count):
+    session['cart_count'] = count
+
+def adjust_cart_count(delta):
+    # On a miss there is nothing to adjust; the next read recounts
+    if 'cart_count' in session:
+        session['cart_count'] = max(session['cart_count'] + delta, 0)
+
+def touch_cart():
+    """Record in the session that a cart line's timestamp was just refreshed."""
+    session['cart_touched'] = time.time()
+
 # Cart context processor
 @app.context_processor
 def inject_cart_count():
     if 'user_id' in session:
-        cart_count = Cart.query.filter_by(user_id=session['user_id']).count()
-        return {'cart_count': cart_count}
+        return {'cart_count': get_cart_count()}
     return {'cart_count': 0}
 
+# Page fragment cache
+# (template, locale) -> (data versions it was rendered from, rendered content block)
+_fragment_cache = {}
+
+# Part of every page ETag, so browsers don't keep pages rendered by older templates
+TEMPLATES_VERSION = str(max(
+    os.path.getmtime(os.path.join(root, name))
+    for root, _, names in os.walk(os.path.join(app.root_path, 'templates')) for name in names
+))
+
+def bump_data_version(*names):
+    """Invalidate cached pages built from these data sets (the caller commits)."""
+    for name in names:
+        bump_counters(DataVersion, {'name': name}, version=1)
+    g.pop('data_versions', None)
+
+def get_data_versions():
+    """Current version of every data set, read once per request."""
+    if 'data_versions' not in g:
+        g.data_versions = dict(db.session.query(DataVersion.name, DataVersion.version))
+    return g.data_versions
+
+def page_etag(template_name, locale, stamp):
+    """Validator for a cached page as rendered for the current visitor."""
+    logged_in = 'user_id' in session
+    visitor = (logged_in, session.get('is_admin', False), get_cart_count() if logged_in else 0)
+    token = repr((template_name, locale, stamp, visitor, TEMPLATES_VERSION))
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+def render_cached_page(template_name):
+    """Render a page from CACHED_PAGES, reusing its content block while the data
+    it depends on is unchanged. The rest of base.html is rendered per visitor.
+    Answers 304 Not Modified when the browser already has this exact page."""
+    data_sets, load_context = CACHED_PAGES[template_name]
+    # Versions are read before the data, so a concurrent write can only make
+    # the cached copy newer than its stamp, never older
+    versions = get_data_versions()
+    stamp = tuple(versions.get(name, 0) for name in data_sets)
+    locale = cache_locale()
+    key = (template_name, locale)
+    
+    # A page carrying flash messages is shown once, so it never gets a validator
+    etag = page_etag(template_name, locale, stamp) if '_flashes' not in session else None
+    if etag and etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render_page_content(template_name, key, stamp, load_context))
+    if etag:
+        response.set_etag(etag)
+    # Pages differ per visitor: let only the browser cache them, and always revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def render_page_content(template_name, key, stamp, load_context):
+    """Render the page around its cached content block, rebuilding the block when stale."""
+    cached = _fragment_cache.get(key)
+    if cached and cached[0] == stamp:
+        content = cached[1]
+    else:
+        forget_missing_image_variants()
+        context = load_context()
+        app.update_template_context(context)
+        template = app.jinja_env.get_template(template_name)
+        started = time.perf_counter()
+        content = Markup(''.join(template.blocks['content'](template.new_context(context))))
+        add_template_time(time.perf_counter() - started)
+        _fragment_cache[key] = (stamp, content)
+    return render_template(template_name, cached_content=content)
+
+def warm_fragment_cache():
+    """Render every cached page in every language so the first visitors get cache hits."""
+    for code in app.config['LANGUAGES']:
+        with app.test_request_context(headers={'Accept-Language': code}):
+            for template_name in CACHED_PAGES:
+                render_cached_page(template_name)
+
+# Order event stream
+class OrderEventBroker:
+    """In-process pub/sub feeding this process's open Server-Sent Events streams.
+    Channels are 'user:<id>' and 'admin'; each subscriber gets its own queue."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+    
+    def subscribe(self, channel):
+        """A new queue on channel, or None when ORDER_EVENTS_MAX_SUBSCRIBERS are already open."""
+        subscriber = queue.Queue(maxsize=app.config['ORDER_EVENTS_BACKLOG'])
+        with self._lock:
+            if sum(len(subscribers) for subscribers in self._subscribers.values()) >= app.config['ORDER_EVENTS_MAX_SUBSCRIBERS']:
+                return None
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+    
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A client this far behind reloads the page anyway; never block the publisher
+                pass
+    
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+order_events = OrderEventBroker()
+
+class OrderEventRelay:
+    """One thread per process that reads new OrderEvent rows every
+    ORDER_EVENTS_POLL_INTERVAL seconds and hands them to the broker, so open
+    streams see changes made by every worker process. It runs only while this
+    process has open streams."""
+    
+    def __init__(self, broker):
+        self._broker = broker
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = 0
+    
+    def is_running(self):
+        with self._lock:
+            return self._thread is not None
+    
+    def ensure_running(self):
+        """Start relaying events committed from now on, unless already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._last_id = latest_order_event_id()
+            self._thread = threading.Thread(target=self._run, name='order-event-relay', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        with app.app_context():
+            while True:
+                time.sleep(app.config['ORDER_EVENTS_POLL_INTERVAL'])
+                with self._lock:
+                    if not self._broker.subscriber_count():
+                        self._thread = None
+                        return
+                try:
+                    # SQLite commits one writer at a time, so ids become visible in order
+                    rows = db.session.query(OrderEvent.id, OrderEvent.user_id, OrderEvent.event, OrderEvent.data)\
+                        .filter(OrderEvent.id > self._last_id).order_by(OrderEvent.id).all()
+                except Exception:
+                    app.logger.exception('Could not read order events')
+                    continue
+                finally:
+                    db.session.remove()
+                for row in rows:
+                    self._broker.publish('user:%d' % row.user_id, row)
+                    self._broker.publish('admin', row)
+                    self._last_id = row.id
+
+order_event_relay = OrderEventRelay(order_events)
+
+def record_order_event(user_id, event, data):
+    """Store an order event for its customer's and the admins' streams (the caller commits)."""
+    db.session.add(OrderEvent(user_id=user_id, event=event, data=json.dumps(dict(data, user_id=user_id))))
+
+def latest_order_event_id():
+    return db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+
+def order_events_since(user_id, last_event_id):
+    """Up to ORDER_EVENTS_REPLAY events after last_event_id, for one customer or (None) the admins."""
+    query = db.session.query(OrderEvent.id, OrderEvent.user_id, OrderEvent.event, OrderEvent.data)\
+        .filter(OrderEvent.id > last_event_id)
+    if user_id is not None:
+        query = query.filter(OrderEvent.user_id == user_id)
+    return query.order_by(OrderEvent.id).limit(app.config['ORDER_EVENTS_REPLAY']).all()
+
+def prune_order_events(older_than_hours=None):
+    """Delete order events older than older_than_hours; returns how many were removed."""
+    if older_than_hours is None:
+        older_than_hours = app.config['ORDER_EVENTS_RETENTION_HOURS']
+    cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+    removed = OrderEvent.query.filter(OrderEvent.timestamp < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+def order_streams_stay_open():
+    """True when an idle stream costs no OS thread: gevent has patched threading
+    (gunicorn -k gevent), unless ORDER_EVENTS_KEEP_OPEN says otherwise."""
+    if app.config['ORDER_EVENTS_KEEP_OPEN'] is not None:
+        return app.config['ORDER_EVENTS_KEEP_OPEN']
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+
+def format_order_event(row):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (row.id, row.event, row.data)
+
+def order_event_stream(user_id=None):
+    """text/event-stream response for one customer's orders, or (user_id None) all
+    orders for the admins. Events the browser missed since its Last-Event-ID come
+    first. Where streams stay open, new events follow until the client disconnects
+    or stays idle for ORDER_EVENTS_IDLE_TIMEOUT; elsewhere the response ends there."""
+    channel = 'admin' if user_id is None else 'user:%d' % user_id
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    stay_open = order_streams_stay_open()
+    subscriber = None
+    if stay_open:
+        subscriber = order_events.subscribe(channel)
+        if subscriber is None:
+            response = jsonify({'success': False, 'message': 'Too many open event streams'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(app.config['ORDER_EVENTS_RECONNECT'])
+            return response
+        # Started before the replay is read, so no event falls between the two
+        order_event_relay.ensure_running()
+    try:
+        if last_event_id is None:
+            # A fresh page is current; remember where it is and send nothing
+            missed, last_event_id = [], latest_order_event_id()
+        else:
+            missed = order_events_since(user_id, last_event_id)
+        db.session.rollback()
+    except Exception:
+        if subscriber is not None:
+            order_events.unsubscribe(channel, subscriber)
+        raise
+    head = 'retry: %d\n\n' % (app.config['ORDER_EVENTS_RECONNECT'] * 1000)
+    head += ''.join(format_order_event(row) for row in missed) or 'id: %d\n\n' % last_event_id
+    last_event_id = missed[-1].id if missed else last_event_id
+    
+    if not stay_open:
+        response = app.response_class(head, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    def generate():
+        sent_id = last_event_id
+        try:
+            yield head
+            idle_until = time.monotonic() + app.config['ORDER_EVENTS_IDLE_TIMEOUT']
+            while True:
+                timeout = min(app.config['ORDER_EVENTS_HEARTBEAT'], idle_until - time.monotonic())
+                if timeout <= 0:
+                    # Ends the stream of a forgotten tab; EventSource reconnects by itself
+                    return
+                try:
+                    row = subscriber.get(timeout=timeout)
+                except queue.Empty:
+                    # Comments keep proxies from closing idle connections
+                    yield ': keep-alive\n\n'
+                    continue
+                if row.id <= sent_id:
+                    # Already sent with the missed events
+                    continue
+                sent_id = row.id
+                idle_until = time.monotonic() + app.config['ORDER_EVENTS_IDLE_TIMEOUT']
+                yield format_order_event(row)
+        finally:
+            order_events.unsubscribe(channel, subscriber)
+    
+    response = app.response_class(generate(), mimetype='text/event-stream')
+    # Also covers a response that is closed before its first chunk is sent
+    response.call_on_close(lambda: order_events.unsubscribe(channel, subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Request metrics
+# Histogram bucket upper bounds: seconds for timings, statements for query counts
+METRICS_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Per-endpoint histograms: name -> (help text, buckets)
+METRICS_HISTOGRAMS = {
+    'http_request_duration_seconds': ('Time spent handling a request', METRICS_TIME_BUCKETS),
+    'db_queries_per_request': ('SQL statements issued by a request', METRICS_QUERY_BUCKETS),
+    'db_duration_seconds': ('Time a request spent waiting on SQL statements', METRICS_TIME_BUCKETS),
+    'template_render_duration_seconds': ('Time a request spent rendering templates', METRICS_TIME_BUCKETS),
+}
+# Anything else is counted as "other" so odd clients can't add label values
+METRICS_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+class Histogram:
+    """Observation counts per bucket (the last one is +Inf), plus their sum."""
+    __slots__ = ('buckets', 'counts', 'total')
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+class RequestMetrics:
+    """Per-endpoint request statistics for this process, in Prometheus text format.
+    Recording a request is a dict lookup and a bisect per histogram under one lock."""
+    
+    def __init__(self, prefix='canteen'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._histograms = {name: {} for name in METRICS_HISTOGRAMS}
+    
+    def record(self, endpoint, method, status, observations):
+        method = method if method in METRICS_METHODS else 'other'
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, value in observations.items():
+                histograms = self._histograms[name]
+                if endpoint not in histograms:
+                    histograms[endpoint] = Histogram(METRICS_HISTOGRAMS[name][1])
+                histograms[endpoint].observe(value)
+    
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            for histograms in self._histograms.values():
+                histograms.clear()
+    
+    def render(self):
+        with self._lock:
+            requests = sorted(self._requests.items())
+            histograms = {name: sorted((endpoint, list(h.counts), h.total) for endpoint, h in by_endpoint.items())
+                          for name, by_endpoint in self._histograms.items()}
+        
+        name = self.prefix + '_http_requests_total'
+        lines = ['# HELP %s Requests handled, by endpoint, method and status' % name, '# TYPE %s counter' % name]
+        for (endpoint, method, status), count in requests:
+            lines.append('%s{endpoint="%s",method="%s",status="%d"} %d' % (name, endpoint, method, status, count))
+        for short_name, (help_text, buckets) in METRICS_HISTOGRAMS.items():
+            name = '%s_%s' % (self.prefix, short_name)
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+            for endpoint, counts, total in histograms[short_name]:
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append('%s_bucket{endpoint="%s",le="%s"} %d' % (name, endpoint, bound, cumulative))
+                lines.append('%s_sum{endpoint="%s"} %r' % (name, endpoint, total))
+                lines.append('%s_count{endpoint="%s"} %d' % (name, endpoint, cumulative))
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+def current_request_stats():
+    """Timings being collected for the current request, or None outside one."""
+    return g.get('request_stats') if has_request_context() else None
+
+@app.before_request
+def start_request_stats():
+    g.request_stats = {'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0, 'template_time': 0.0}
+
+def record_request(stats, status_code):
+    request_metrics.record(request.endpoint or 'unmatched', request.method, status_code, {
+        'http_request_duration_seconds': time.perf_counter() - stats['started'],
+        'db_queries_per_request': stats['queries'],
+        'db_duration_seconds': stats['db_time'],
+        'template_render_duration_seconds': stats['template_time'],
+    })
+
+@app.after_request
+def record_request_stats(response):
+    stats = g.pop('request_stats', None)
+    if stats is not None:
+        record_request(stats, response.status_code)
+    return response
+
+@app.teardown_request
+def record_failed_request_stats(exc):
+    """Count requests that never reached record_request_stats as 500s: errors that
+    propagate (debug, PROPAGATE_EXCEPTIONS) or a failing after_request hook."""
+    stats = g.pop('request_stats', None)
+    if stats is not None:
+        record_request(stats, 500)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = current_request_stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_time'] += elapsed
+    if elapsed * 1000 >= app.config['SLOW_QUERY_THRESHOLD_MS']:
+        log_slow_query(conn, cursor, statement, parameters, executemany, elapsed)
+
+def add_template_time(seconds):
+    stats = current_request_stats()
+    if stats is not None:
+        stats['template_time'] += seconds
+
+class TimedTemplate(app.jinja_env.template_class):
+    """Template that adds its render time to the request metrics. Includes and
+    parent templates render inside render(), so nothing is counted twice."""
+    
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            add_template_time(time.perf_counter() - started)
+
+app.jinja_env.template_class = TimedTemplate
+
+# Slow query log
+slow_queries = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+_slow_query_file_lock = threading.Lock()
+
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_PLACEHOLDER_LIST_RE = re.compile(r'\(\?(?:, \?)+\)')
+
+def normalize_sql(statement):
+    """Statement with literals replaced by ? and placeholder lists collapsed."""
+    statement = SQL_LITERAL_RE.sub('?', ' '.join(statement.split()))
+    return SQL_PLACEHOLDER_LIST_RE.sub('(?, ...)', statement)
+
+def parameter_shape(parameters, executemany=False):
+    """Types of the bound parameters, never their values: '(int, str)', '3 x (int)'."""
+    if executemany:
+        return '%d x %s' % (len(parameters), parameter_shape(parameters[0]) if parameters else '()')
+    if isinstance(parameters, dict):
+        return '{%s}' % ', '.join('%s: %s' % (name, type(value).__name__) for name, value in parameters.items())
+    types = [type(value).__name__ for value in parameters or ()]
+    if len(types) > 3 and len(set(types)) == 1:
+        return '(%d x %s)' % (len(types), types[0])
+    return '(%s)' % ', '.join(types)
+
+def explain_query_plan(cursor, statement, parameters):
+    """SQLite's EXPLAIN QUERY PLAN for a statement, one indented line per step."""
+    try:
+        rows = cursor.connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    except sqlite3.Error:
+        return []
+    depths = {0: -1}
+    plan = []
+    for step, parent, _, detail in rows:
+        depths[step] = depths.get(parent, -1) + 1
+        plan.append('  ' * depths[step] + detail)
+    return plan
+
+def log_slow_query(conn, cursor, statement, parameters, executemany, elapsed):
+    """Keep a slow statement in the ring buffer and, if configured, the JSON lines file."""
+    plan = []
+    if conn.dialect.name == 'sqlite':
+        plan = explain_query_plan(cursor, statement, parameters[0] if executemany else parameters)
+    entry = {
+        'time': datetime.utcnow().isoformat(timespec='seconds'),
+        'duration_ms': round(elapsed * 1000, 2),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'sql': normalize_sql(statement),
+        'parameters': parameter_shape(parameters, executemany),
+        'plan': plan,
+    }
+    slow_queries.append(entry)
+    app.logger.warning('Slow query (%.1f ms) in %s: %s', entry['duration_ms'], entry['endpoint'], entry['sql'])
+    if app.config['SLOW_QUERY_LOG_FILE']:
+        with _slow_query_file_lock, open(app.config['SLOW_QUERY_LOG_FILE'], 'a') as log_file:
+            log_file.write(json.dumps(entry) + '\n')
+
+def slow_query_summary():
+    """Logged slow statements grouped by normalized SQL, slowest first."""
+    groups = {}
+    for entry in list(slow_queries):
+        group = groups.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'endpoints': set(), 'slowest': entry
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['endpoints'].add(entry['endpoint'] or '-')
+        if entry['duration_ms'] > group['slowest']['duration_ms']:
+            group['slowest'] = entry
+    return sorted(groups.values(), key=lambda group: group['slowest']['duration_ms'], reverse=True)
+
+def metrics_token_matches():
+    token = app.config['METRICS_TOKEN']
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token)
+
+# Current user
+# What every authenticated request needs to know about its user; never the password hash
+Identity = namedtuple('Identity', ['id', 'username', 'is_admin'])
+
+class IdentityCache:
+    """Least-recently-used user_id -> Identity map whose entries expire after a TTL.
+    A user that no longer exists is cached as None, so its stale sessions stay cheap."""
+    
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+    
+    def get(self, user_id):
+        """(True, identity) on a fresh hit, (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, entry[1]
+    
+    def put(self, user_id, identity):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+identity_cache = IdentityCache(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+
+def load_identity(user_id):
+    """Identity of a user from the cache, or one column query on a miss."""
+    found, identity = identity_cache.get(user_id)
+    if not found:
+        row = db.session.query(User.id, User.username, User.is_admin).filter_by(id=user_id).first()
+        identity = Identity(row.id, row.username, bool(row.is_admin)) if row else None
+        identity_cache.put(user_id, identity)
+    return identity
+
+@app.before_request
+def load_current_user():
+    """Resolve the logged-in user into g.user once, before any view or decorator runs."""
+    g.user = None
+    if 'user_id' not in session:
+        return
+    g.user = load_identity(session['user_id'])
+    if g.user is None:
+        # The account is gone; drop the session rather than trust it
+        session.clear()
+    elif session.get('is_admin') != g.user.is_admin:
+        # Templates and page ETags read the flag from the session
+        session['is_admin'] = g.user.is_admin
+
 # Decorators
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if g.user is None:
             flash('Please login first.')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -141,87 +1620,145 @@ def login_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session or not session.get('is_admin'):
+        if g.user is None or not g.user.is_admin:
             flash('Admin access required.')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
 # Routes
-@app.route('/')
-def index():
+def load_index_context():
     notices = Notice.query.order_by(Notice.timestamp.desc()).limit(5).all()
     
     # Get only premium items with ratings 4.5 and above for showcase
-    featured_items_query = db.session.query(
-        MenuItem,
-        db.func.avg(Feedback.rating).label('avg_rating'),
-        db.func.count(Feedback.id).label('rating_count')
-    ).join(Feedback, MenuItem.id == Feedback.item_id)\
-     .filter(MenuItem.available == True)\
-     .group_by(MenuItem.id)\
-     .having(db.func.avg(Feedback.rating) >= 4.5)\
-     .order_by(db.func.avg(Feedback.rating).desc(), db.func.count(Feedback.id).desc())\
+    avg_rating = RatingSummary.rating_sum * 1.0 / RatingSummary.rating_count
+    featured_items_query = db.session.query(MenuItem, RatingSummary)\
+     .join(RatingSummary, MenuItem.id == RatingSummary.item_id)\
+     .filter(MenuItem.available == True, RatingSummary.rating_count > 0)\
+     .filter(avg_rating >= 4.5)\
+     .order_by(avg_rating.desc(), RatingSummary.rating_count.desc())\
      .all()
     
     # Process the premium items for display
-    featured_items = []
-    for item_data in featured_items_query:
-        item = item_data[0]
-        item.average_rating = round(item_data[1], 1) if item_data[1] else 0
-        item.total_ratings = item_data[2] if item_data[2] else 0
-        featured_items.append(item)
+    featured_items = [apply_rating_summary(item, summary) for item, summary in featured_items_query]
     
-    return render_template('index.html', notices=notices, featured_items=featured_items)
+    return {'notices': notices, 'featured_items': featured_items}
 
-@app.route('/menu')
-def menu():
+def load_menu_context():
     # Get all items with their ratings, sorted by rating (highest first)
-    rated_items_query = db.session.query(
-        MenuItem,
-        db.func.avg(Feedback.rating).label('avg_rating'),
-        db.func.count(Feedback.id).label('rating_count')
-    ).outerjoin(Feedback, MenuItem.id == Feedback.item_id)\
-     .group_by(MenuItem.id)\
+    avg_rating = RatingSummary.rating_sum * 1.0 / RatingSummary.rating_count
+    rated_items_query = db.session.query(MenuItem, RatingSummary)\
+     .outerjoin(RatingSummary, MenuItem.id == RatingSummary.item_id)\
      .order_by(
-         db.func.avg(Feedback.rating).desc().nullslast(),
-         db.func.count(Feedback.id).desc(),
+         avg_rating.desc().nullslast(),
+         RatingSummary.rating_count.desc().nullslast(),
          MenuItem.name.asc()
      ).all()
     
     # Process all items for display
-    menu_items = []
-    for item_data in rated_items_query:
-        item = item_data[0]
-        item.average_rating = round(item_data[1], 1) if item_data[1] else 0
-        item.total_ratings = item_data[2] if item_data[2] else 0
-        menu_items.append(item)
+    menu_items = [apply_rating_summary(item, summary) for item, summary in rated_items_query]
     
-    return render_template('menu.html', menu_items=menu_items)
+    return {'menu_items': menu_items}
+
+def load_notices_context():
+    return {'notices': Notice.query.order_by(Notice.timestamp.desc()).all()}
+
+# Pages served through render_cached_page: template -> (data sets it shows, context loader)
+CACHED_PAGES = {
+    'index.html': (('menu', 'notices'), load_index_context),
+    'menu.html': (('menu',), load_menu_context),
+    'notices.html': (('notices',), load_notices_context),
+}
+
+@app.route('/')
+def index():
+    return render_cached_page('index.html')
+
+@app.route('/menu')
+def menu():
+    return render_cached_page('menu.html')
+
+# (locale, shift) -> (menu data version, ETag, serialized JSON body)
+_menu_api_cache = {}
+
+def serialize_menu(version, shift):
+    """Compact JSON for every available menu item, optionally limited to one shift."""
+    query = db.session.query(MenuItem, RatingSummary)\
+     .outerjoin(RatingSummary, MenuItem.id == RatingSummary.item_id)\
+     .filter(MenuItem.available == True)
+    if shift:
+        query = query.filter(MenuItem.shift == shift)
+    items = [{
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'price': item.price,
+        'shift': item.shift,
+        'image': image_variants(item.image_path),
+        'rating': {
+            'average': summary.average if summary else 0,
+            'count': summary.rating_count if summary else 0
+        }
+    } for item, summary in query.order_by(MenuItem.name.asc())]
+    payload = {
+        'version': version,
+        'locale': cache_locale(),
+        'labels': {'add_to_cart': gettext('Add to Cart')},
+        'items': items
+    }
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+@app.route('/api/menu')
+def api_menu():
+    shift = request.args.get('shift') or None
+    if shift and shift not in MEAL_SHIFTS:
+        return jsonify({'success': False, 'message': 'Unknown meal shift'}), 400
+    
+    version = get_data_versions().get('menu', 0)
+    key = (cache_locale(), shift)
+    cached = _menu_api_cache.get(key)
+    if not cached or cached[0] != version:
+        forget_missing_image_variants()
+        body = serialize_menu(version, shift)
+        cached = (version, hashlib.sha1(body).hexdigest(), body)
+        _menu_api_cache[key] = cached
+    _, etag, body = cached
+    
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.update(['Accept-Language', 'Cookie'])
+    return response
 
 @app.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    total_orders = Order.query.count()
-    
-    # Calculate total revenue using the new OrderItem structure
-    total_revenue = db.session.query(db.func.sum(OrderItem.quantity * OrderItem.unit_price))\
-        .scalar() or 0
+    # Totals come from one all-time counter row per status instead of scanning orders
+    total_orders, total_revenue = db.session.query(
+        db.func.sum(SalesTotal.order_count),
+        db.func.sum(SalesTotal.revenue)
+    ).one()
+    total_orders = total_orders or 0
+    total_revenue = total_revenue or 0
     
     total_items = MenuItem.query.count()
     
-    # Get recent orders with order_items loaded
+    # Get recent orders with order_items and their menu items loaded
     recent_orders = Order.query.options(
         db.joinedload('user'), 
-        db.joinedload('order_items')
+        db.selectinload('order_items').joinedload('item')
     ).order_by(Order.timestamp.desc()).limit(10).all()
     
-    # Get popular items based on OrderItem quantities
+    # Get popular items from their all-time quantities
     popular_items = db.session.query(
         MenuItem, 
-        db.func.sum(OrderItem.quantity).label('total_quantity')
-    ).join(OrderItem).group_by(MenuItem.id)\
-     .order_by(db.func.sum(OrderItem.quantity).desc()).limit(5).all()
+        ItemSalesTotal.quantity.label('total_quantity')
+    ).join(ItemSalesTotal, MenuItem.id == ItemSalesTotal.item_id)\
+     .order_by(ItemSalesTotal.quantity.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                          total_orders=total_orders,
@@ -230,6 +1767,78 @@ def admin_dashboard():
                          recent_orders=recent_orders,
                          popular_items=popular_items)
 
+@app.route('/admin/reports/sales')
+@admin_required
+def admin_sales_report():
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in SALES_REPORT_BUCKETS:
+        return jsonify({'success': False, 'message': 'bucket must be day or week'}), 400
+    shift = request.args.get('shift') or None
+    if shift and shift not in MEAL_SHIFTS:
+        return jsonify({'success': False, 'message': 'Unknown meal shift'}), 400
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'start and end must be YYYY-MM-DD dates'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': 'start must not be after end'}), 400
+    if (end - start).days >= app.config['SALES_REPORT_MAX_DAYS']:
+        return jsonify({'success': False,
+                        'message': 'A report covers at most %d days' % app.config['SALES_REPORT_MAX_DAYS']}), 400
+    if bucket == 'week':
+        # Whole Monday-Sunday weeks, so every week is cached and reported the same way
+        start -= timedelta(days=start.weekday())
+        end += timedelta(days=6 - end.weekday())
+
+    versions = sales_day_versions(start, end)
+    key = (start, end, bucket, shift)
+    with _sales_report_lock:
+        cached = _sales_report_cache.get(key)
+        if cached and cached[0] == versions:
+            _sales_report_cache.move_to_end(key)
+    if not cached or cached[0] != versions:
+        body = serialize_sales_report(start, end, bucket, shift, versions)
+        cached = (versions, hashlib.sha1(body).hexdigest(), body)
+        with _sales_report_lock:
+            store_lru(_sales_report_cache, key, cached, app.config['SALES_REPORT_CACHE_SIZE'])
+    _, etag, body = cached
+
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    # Admins can open it in the browser; scrapers present METRICS_TOKEN instead of a session
+    if not metrics_token_matches() and not (g.user and g.user.is_admin):
+        flash('Admin access required.')
+        return redirect(url_for('login'))
+    response = app.response_class(request_metrics.render(), mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/slow-queries')
+@admin_required
+def admin_slow_queries():
+    return render_template('admin_slow_queries.html', groups=slow_query_summary(),
+                           threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'],
+                           log_size=slow_queries.maxlen)
+
+@app.route('/admin/slow-queries/clear', methods=['POST'])
+@admin_required
+def clear_slow_queries():
+    slow_queries.clear()
+    flash('Slow query log cleared.')
+    return redirect(url_for('admin_slow_queries'))
+
 @app.route('/admin/menu')
 @admin_required
 def admin_menu():
@@ -239,6 +1848,7 @@ def admin_menu():
 @app.route('/admin/menu/add', methods=['POST'])
 @admin_required
 def admin_menu_add():
+    image_path = None
     try:
         name = request.form['name']
         description = request.form['description']
@@ -246,11 +1856,8 @@ def admin_menu_add():
         shift = request.form['shift']
         
         image = request.files.get('image')
-        image_path = None
         if image and image.filename:
-            filename = secure_filename(image.filename)
-            image_path = os.path.join('static/uploads', filename)
-            image.save(os.path.join(app.root_path, image_path))
+            image_path = save_uploaded_image(image)
         
         item = MenuItem(
             name=name,
@@ -260,10 +1867,12 @@ def admin_menu_add():
             image_path=image_path
         )
         db.session.add(item)
+        bump_data_version('menu')
         db.session.commit()
         
         return jsonify({'success': True})
     except Exception as e:
+        discard_uploaded_image(image_path)
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/admin/menu/<int:item_id>', methods=['GET', 'PUT', 'DELETE'])
@@ -282,6 +1891,8 @@ def admin_menu_item(item_id):
         })
     
     elif request.method == 'PUT':
+        old_image_path = item.image_path
+        new_image_path = None
         try:
             item.name = request.form['name']
             item.description = request.form['description']
@@ -290,24 +1901,25 @@ def admin_menu_item(item_id):
             
             image = request.files.get('image')
             if image and image.filename:
-                if item.image_path and os.path.exists(os.path.join(app.root_path, item.image_path)):
-                    os.remove(os.path.join(app.root_path, item.image_path))
-                filename = secure_filename(image.filename)
-                image_path = os.path.join('static/uploads', filename)
-                image.save(os.path.join(app.root_path, image_path))
-                item.image_path = image_path
+                new_image_path = item.image_path = save_uploaded_image(image)
             
+            bump_data_version('menu')
             db.session.commit()
+            # Other items may share the old image, so only drop it once unreferenced
+            if item.image_path != old_image_path:
+                release_uploaded_image(old_image_path)
             return jsonify({'success': True})
         except Exception as e:
+            discard_uploaded_image(new_image_path if new_image_path != old_image_path else None)
             return jsonify({'success': False, 'error': str(e)})
     
     elif request.method == 'DELETE':
         try:
-            if item.image_path and os.path.exists(os.path.join(app.root_path, item.image_path)):
-                os.remove(os.path.join(app.root_path, item.image_path))
+            image_path = item.image_path
             db.session.delete(item)
+            bump_data_version('menu')
             db.session.commit()
+            release_uploaded_image(image_path)
             return jsonify({'success': True})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)})
@@ -317,6 +1929,7 @@ def admin_menu_item(item_id):
 def admin_toggle_item(item_id):
     item = MenuItem.query.get_or_404(item_id)
     item.available = not item.available
+    bump_data_version('menu')
     db.session.commit()
     return jsonify({'success': True})
 
@@ -332,8 +1945,12 @@ def admin_update_order_status(order_id):
     else:
         status = request.form.get('status')
     
-    if status in ['pending', 'completed', 'cancelled']:
+    if status in ORDER_STATUSES:
+        previous_status = order.status
+        record_status_change(order, order.status, status)
         order.status = status
+        record_order_event(order.user_id, 'order_status',
+                           {'order_id': order.id, 'status': status, 'previous_status': previous_status})
         db.session.commit()
         
         # Return appropriate response based on request type
@@ -387,13 +2004,19 @@ def add_feedback(item_id):
             rating = request.form.get('rating')
             comment = request.form.get('comment')
         
+        rating = int(rating)
+        if rating < 1 or rating > 5:
+            raise ValueError('Rating must be between 1 and 5')
+        
         feedback = Feedback(
             user_id=session['user_id'],
             item_id=item_id,
-            rating=int(rating),
+            rating=rating,
             comment=comment
         )
         db.session.add(feedback)
+        record_rating(item_id, rating)
+        bump_data_version('menu')
         db.session.commit()
         
         if request.is_json:
@@ -402,6 +2025,7 @@ def add_feedback(item_id):
             flash('Thank you for your feedback!')
             return redirect(url_for('view_orders'))
     except Exception as e:
+        db.session.rollback()
         if request.is_json:
             return jsonify({'success': False, 'error': str(e)})
         else:
@@ -414,12 +2038,22 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
-            session['user_id'] = user.id
-            session['is_admin'] = user.is_admin
-            flash('Successfully logged in!')
-            return redirect(url_for('index'))
+        user = db.session.query(User.id, User.is_admin, User.password).filter_by(username=username).first()
+        # Hand the connection back to the pool while the hash is checked
+        db.session.rollback()
+        try:
+            if user and verify_password(user.password, password):
+                if password_needs_rehash(user.password):
+                    User.query.filter_by(id=user.id).update({'password': hash_password(password)})
+                    db.session.commit()
+                session['user_id'] = user.id
+                session['is_admin'] = user.is_admin
+                session.pop('cart_count', None)
+                flash('Successfully logged in!')
+                return redirect(url_for('index'))
+        except PasswordHashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.')
+            return render_template('login.html'), 503
         
         flash('Invalid username or password.')
     return render_template('login.html')
@@ -439,7 +2073,12 @@ def register():
             flash('Username already exists.')
             return redirect(url_for('register'))
         
-        hashed_password = generate_password_hash(password)
+        db.session.rollback()
+        try:
+            hashed_password = hash_password(password)
+        except PasswordHashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.')
+            return render_template('register.html'), 503
         new_user = User(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -476,6 +2115,7 @@ def add_notice():
     
     notice = Notice(title=title, content=content)
     db.session.add(notice)
+    bump_data_version('notices')
     db.session.commit()
     
     flash('Notice added successfully!')
@@ -486,6 +2126,7 @@ def add_notice():
 def delete_notice(notice_id):
     notice = Notice.query.get_or_404(notice_id)
     db.session.delete(notice)
+    bump_data_version('notices')
     db.session.commit()
     
     flash('Notice deleted successfully!')
@@ -493,8 +2134,7 @@ def delete_notice(notice_id):
 
 @app.route('/notices')
 def view_notices():
-    notices = Notice.query.order_by(Notice.timestamp.desc()).all()
-    return render_template('notices.html', notices=notices)
+    return render_cached_page('notices.html')
 
 # Order System Routes
 @app.route('/place_order', methods=['POST'])
@@ -522,9 +2162,24 @@ def place_order():
 @app.route('/orders')
 @login_required
 def view_orders():
-    orders = Order.query.options(db.joinedload('order_items')).filter_by(user_id=session['user_id']).order_by(Order.timestamp.desc()).all()
+    orders = Order.query.options(db.selectinload('order_items').joinedload('item'))\
+        .filter_by(user_id=session['user_id'])\
+        .order_by(Order.timestamp.desc()).all()
     return render_template('orders.html', orders=orders)
 
+@app.route('/orders/archive')
+@login_required
+def view_archived_orders():
+    orders = ArchivedOrder.query.options(db.selectinload('order_items').joinedload('item'))\
+        .filter_by(user_id=session['user_id'])\
+        .order_by(ArchivedOrder.timestamp.desc()).all()
+    return render_template('orders.html', orders=orders, archived=True)
+
+@app.route('/orders/events')
+@login_required
+def order_events_stream():
+    return order_event_stream(session['user_id'])
+
 @app.route('/orders/<int:order_id>/cancel', methods=['POST'])
 @login_required
 def cancel_order(order_id):
@@ -537,7 +2192,10 @@ def cancel_order(order_id):
         flash('You can only cancel pending orders.')
         return redirect(url_for('view_orders'))
     
+    record_status_change(order, order.status, 'cancelled')
     order.status = 'cancelled'
+    record_order_event(order.user_id, 'order_status',
+                       {'order_id': order.id, 'status': 'cancelled', 'previous_status': 'pending'})
     db.session.commit()
     
     flash('Order cancelled successfully.')
@@ -580,8 +2238,9 @@ def add_to_cart(item_id):
     existing_cart_item = Cart.query.filter_by(user_id=session['user_id'], item_id=item_id).first()
     
     if existing_cart_item:
-        # Update quantity
+        # Update quantity; the timestamp records when the cart was last touched
         existing_cart_item.quantity += quantity
+        existing_cart_item.timestamp = datetime.utcnow()
     else:
         # Add new item to cart
         cart_item = Cart(
@@ -592,12 +2251,14 @@ def add_to_cart(item_id):
         db.session.add(cart_item)
     
     db.session.commit()
+    if not existing_cart_item:
+        adjust_cart_count(1)
+    touch_cart()
     
     # Always return JSON for API endpoints, or if it's an AJAX request
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json
     if is_ajax or request.headers.get('Accept', '').find('application/json') != -1:
-        cart_count = Cart.query.filter_by(user_id=session['user_id']).count()
-        return jsonify({'success': True, 'cart_count': cart_count, 'message': f'{menu_item.name} added to cart'})
+        return jsonify({'success': True, 'cart_count': get_cart_count(), 'message': f'{menu_item.name} added to cart'})
     
     flash(f'{menu_item.name} added to cart!')
     return redirect(url_for('menu'))
@@ -621,8 +2282,13 @@ def update_cart_item(cart_id):
         db.session.delete(cart_item)
     else:
         cart_item.quantity = quantity
+        cart_item.timestamp = datetime.utcnow()
     
     db.session.commit()
+    if quantity <= 0:
+        adjust_cart_count(-1)
+    else:
+        touch_cart()
     
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json
     if is_ajax or request.headers.get('Accept', '').find('application/json') != -1:
@@ -634,7 +2300,7 @@ def update_cart_item(cart_id):
 @app.route('/cart/remove/<int:cart_id>', methods=['POST'])
 @login_required
 def remove_from_cart(cart_id):
-    cart_item = Cart.query.get_or_404(cart_id)
+    cart_item = Cart.query.options(db.joinedload('item')).get_or_404(cart_id)
     
     # Verify ownership
     if cart_item.user_id != session['user_id']:
@@ -647,11 +2313,11 @@ def remove_from_cart(cart_id):
     item_name = cart_item.item.name
     db.session.delete(cart_item)
     db.session.commit()
+    adjust_cart_count(-1)
     
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json
     if is_ajax or request.headers.get('Accept', '').find('application/json') != -1:
-        cart_count = Cart.query.filter_by(user_id=session['user_id']).count()
-        return jsonify({'success': True, 'cart_count': cart_count, 'message': f'{item_name} removed from cart'})
+        return jsonify({'success': True, 'cart_count': get_cart_count(), 'message': f'{item_name} removed from cart'})
     
     flash(f'{item_name} removed from cart!')
     return redirect(url_for('view_cart'))
@@ -661,6 +2327,7 @@ def remove_from_cart(cart_id):
 def clear_cart():
     Cart.query.filter_by(user_id=session['user_id']).delete()
     db.session.commit()
+    set_cart_count(0)
     
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json
     if is_ajax or request.headers.get('Accept', '').find('application/json') != -1:
@@ -669,61 +2336,176 @@ def clear_cart():
     flash('Cart cleared successfully!')
     return redirect(url_for('view_cart'))
 
+@app.route('/cart/batch', methods=['POST'])
+@login_required
+def batch_update_cart():
+    """Apply a list of {item_id, delta} operations to the cart in one transaction."""
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'message': 'No cart operations given'}), 400
+    
+    # Collapse repeated clicks on the same item into a single delta
+    deltas = {}
+    try:
+        for operation in operations:
+            item_id = int(operation['item_id'])
+            deltas[item_id] = deltas.get(item_id, 0) + int(operation.get('delta', 1))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid cart operation'}), 400
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    
+    # Adding requires an available item; removing never does
+    added_ids = [item_id for item_id, delta in deltas.items() if delta > 0]
+    if added_ids:
+        available_ids = {row.id for row in db.session.query(MenuItem.id)
+                         .filter(MenuItem.id.in_(added_ids), MenuItem.available == True)}
+        if len(available_ids) != len(added_ids):
+            return jsonify({'success': False, 'message': 'Item is not available'}), 400
+    
+    if deltas:
+        now = datetime.utcnow()
+        cart_upsert = upsert_statement(Cart, ['user_id', 'item_id'],
+                                       add_columns=['quantity'], replace_columns=['timestamp'])
+        db.session.execute(cart_upsert, [
+            {'user_id': session['user_id'], 'item_id': item_id, 'quantity': delta, 'timestamp': now}
+            for item_id, delta in deltas.items()
+        ])
+        Cart.query.filter(Cart.user_id == session['user_id'], Cart.quantity <= 0)\
+            .delete(synchronize_session=False)
+    db.session.commit()
+    if deltas:
+        touch_cart()
+    
+    cart_rows = db.session.query(Cart.id, Cart.item_id, Cart.quantity, MenuItem.name, MenuItem.price)\
+        .join(MenuItem, MenuItem.id == Cart.item_id)\
+        .filter(Cart.user_id == session['user_id'])\
+        .order_by(Cart.id).all()
+    set_cart_count(len(cart_rows))
+    
+    return jsonify({
+        'success': True,
+        'message': 'Cart updated',
+        'cart_count': len(cart_rows),
+        'total_amount': sum(row.quantity * row.price for row in cart_rows),
+        'items': [{
+            'id': row.id,
+            'item_id': row.item_id,
+            'name': row.name,
+            'price': row.price,
+            'quantity': row.quantity
+        } for row in cart_rows]
+    })
+
 @app.route('/cart/checkout', methods=['POST'])
 @login_required
 def checkout():
-    cart_items = Cart.query.filter_by(user_id=session['user_id']).all()
+    user_id = session['user_id']
     
-    if not cart_items:
+    # Cart lines with current menu prices and shifts in one query
+    cart_rows = db.session.query(Cart.item_id, Cart.quantity, MenuItem.price, MenuItem.shift)\
+        .join(MenuItem, MenuItem.id == Cart.item_id)\
+        .filter(Cart.user_id == user_id)\
+        .order_by(Cart.id).all()
+    
+    if not cart_rows:
         flash('Your cart is empty.')
         return redirect(url_for('view_cart'))
     
-    # Group cart items by meal shift
-    meal_groups = {}
-    for cart_item in cart_items:
-        meal_shift = cart_item.item.meal_shift
-        if meal_shift not in meal_groups:
-            meal_groups[meal_shift] = []
-        meal_groups[meal_shift].append(cart_item)
-    
-    # Create one order per meal shift
-    orders_created = 0
-    for meal_shift, items in meal_groups.items():
-        total_amount = sum(item.quantity * item.item.price for item in items)
-        
-        # Create the order
-        order = Order(
-            user_id=session['user_id'],
-            meal_shift=meal_shift,
-            total_amount=total_amount
-        )
-        db.session.add(order)
-        db.session.flush()  # To get the order ID
-        
-        # Create order items
-        for cart_item in items:
-            order_item = OrderItem(
-                order_id=order.id,
-                item_id=cart_item.item_id,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.item.price
-            )
-            db.session.add(order_item)
-        
-        orders_created += 1
-    
-    # Clear the cart after creating orders
-    Cart.query.filter_by(user_id=session['user_id']).delete()
+    # Create one order per meal shift, its total summed from the cart lines
+    placed_at = datetime.utcnow()
+    order_totals = {}
+    for row in cart_rows:
+        order_totals[row.shift] = order_totals.get(row.shift, 0) + row.quantity * row.price
+    order_ids = insert_orders([
+        {'user_id': user_id, 'meal_shift': meal_shift, 'timestamp': placed_at,
+         'status': 'pending', 'total_amount': total}
+        for meal_shift, total in order_totals.items()
+    ])
+    
+    db.session.execute(OrderItem.__table__.insert(), [
+        {'order_id': order_ids[row.shift], 'item_id': row.item_id,
+         'quantity': row.quantity, 'unit_price': row.price}
+        for row in cart_rows
+    ])
+    
+    record_orders_placed(user_id, placed_at, [(row.shift, row.item_id, row.quantity, row.price) for row in cart_rows])
+    
+    record_order_event(user_id, 'order_placed', {
+        'orders': [{'order_id': order_id, 'meal_shift': meal_shift} for meal_shift, order_id in order_ids.items()]
+    })
+    
+    # Clear the cart in the same transaction
+    Cart.query.filter_by(user_id=user_id).delete(synchronize_session=False)
     db.session.commit()
+    set_cart_count(0)
     
-    flash(f'Successfully placed {orders_created} orders!')
+    flash(f'Successfully placed {len(order_ids)} orders!')
     return redirect(url_for('view_orders'))
 
+def insert_orders(rows):
+    """Insert Order rows and return {meal_shift: new order id}, taken from the
+    inserts themselves: one INSERT ... RETURNING where the database supports
+    it, otherwise one INSERT per order (a checkout creates at most one per shift)."""
+    table = Order.__table__
+    if db.engine.dialect.full_returning:
+        result = db.session.execute(table.insert().values(rows).returning(table.c.meal_shift, table.c.id))
+        return dict(result.all())
+    return {row['meal_shift']: db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows}
+
+def encode_order_cursor(order):
+    return '%s_%d' % (order.timestamp.isoformat(), order.id)
+
+def decode_order_cursor(cursor):
+    """Parse a '<timestamp>_<id>' cursor; raises ValueError when malformed."""
+    timestamp, _, order_id = cursor.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(order_id)
+
+@app.route('/admin/orders/events')
+@admin_required
+def admin_order_events_stream():
+    return order_event_stream()
+
 @app.route('/admin/orders')
 @admin_required
 def admin_orders():
-    orders = Order.query.options(db.joinedload('user'), db.joinedload('order_items')).order_by(Order.timestamp.desc()).all()
-    return render_template('admin_orders.html', orders=orders)
+    filters = {
+        'status': request.args.get('status') if request.args.get('status') in ORDER_STATUSES else '',
+        'meal_shift': request.args.get('meal_shift') if request.args.get('meal_shift') in MEAL_SHIFTS else '',
+        'date_from': request.args.get('date_from', type=date.fromisoformat),
+        'date_to': request.args.get('date_to', type=date.fromisoformat)
+    }
+    cursor = request.args.get('cursor', type=decode_order_cursor)
+    per_page = max(1, min(request.args.get('per_page', app.config['ADMIN_ORDERS_PER_PAGE'], type=int), 100))
+    
+    query = Order.query.options(db.joinedload('user'), db.selectinload('order_items').joinedload('item'))
+    if filters['status']:
+        query = query.filter(Order.status == filters['status'])
+    if filters['meal_shift']:
+        query = query.filter(Order.meal_shift == filters['meal_shift'])
+    if filters['date_from']:
+        query = query.filter(Order.timestamp >= datetime.combine(filters['date_from'], datetime.min.time()))
+    if filters['date_to']:
+        query = query.filter(Order.timestamp < datetime.combine(filters['date_to'] + timedelta(days=1), datetime.min.time()))
+    if cursor:
+        # Keyset pagination: continue strictly after the last (timestamp, id) shown
+        query = query.filter(db.tuple_(Order.timestamp, Order.id) < cursor)
+    
+    # Fetch one extra row to know whether an older page exists
+    orders = query.order_by(Order.timestamp.desc(), Order.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(orders) > per_page:
+        orders = orders[:per_page]
+        next_cursor = encode_order_cursor(orders[-1])
+    
+    return render_template('admin_orders.html',
+                         orders=orders,
+                         filters=filters,
+                         next_cursor=next_cursor,
+                         is_first_page=cursor is None,
+                         per_page=per_page,
+                         meal_shifts=MEAL_SHIFTS,
+                         order_statuses=ORDER_STATUSES)
 
 # Route removed - duplicate of admin_update_order_status above
 
@@ -731,19 +2513,14 @@ def admin_orders():
 @app.route('/profile')
 @login_required
 def profile():
-    user = User.query.get(session['user_id'])
-    if not user:
-        flash('User not found.')
-        return redirect(url_for('login'))
+    user = g.user
     
-    # Get user's order statistics
-    total_orders = Order.query.filter_by(user_id=user.id).count()
-    completed_orders = Order.query.filter_by(user_id=user.id, status='completed').count()
-    pending_orders = Order.query.filter_by(user_id=user.id, status='pending').count()
+    # Order statistics come from the counters, not the order history
+    stats = UserStats.query.get(user.id)
     
     # Get recent orders
     recent_orders = Order.query.filter_by(user_id=user.id)\
-        .options(db.joinedload('order_items'))\
+        .options(db.selectinload('order_items'))\
         .order_by(Order.timestamp.desc())\
         .limit(10).all()
     
@@ -753,36 +2530,24 @@ def profile():
         .order_by(Feedback.timestamp.desc())\
         .limit(5).all()
     
-    # Calculate total spent
-    total_spent = db.session.query(db.func.sum(OrderItem.quantity * OrderItem.unit_price))\
-        .select_from(OrderItem)\
-        .join(Order, Order.id == OrderItem.order_id)\
-        .filter(Order.user_id == user.id, Order.status == 'completed')\
-        .scalar() or 0
-    
     return render_template('profile.html', 
                          user=user,
-                         total_orders=total_orders,
-                         completed_orders=completed_orders,
-                         pending_orders=pending_orders,
+                         total_orders=stats.order_count if stats else 0,
+                         completed_orders=stats.completed_count if stats else 0,
+                         pending_orders=stats.pending_count if stats else 0,
                          recent_orders=recent_orders,
                          user_feedback=user_feedback,
-                         total_spent=total_spent)
+                         total_spent=stats.total_spent if stats else 0)
 
 @app.route('/admin/profile')
 @admin_required
 def admin_profile():
-    user = User.query.get(session['user_id'])
-    if not user:
-        flash('User not found.')
-        return redirect(url_for('login'))
+    user = g.user
     
     # Get basic admin statistics for the header display
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(OrderItem.quantity * OrderItem.unit_price))\
-        .select_from(OrderItem)\
-        .join(Order, Order.id == OrderItem.order_id)\
-        .filter(Order.status == 'completed')\
+    total_orders = db.session.query(db.func.sum(SalesTotal.order_count)).scalar() or 0
+    total_revenue = db.session.query(SalesTotal.revenue)\
+        .filter(SalesTotal.status == 'completed')\
         .scalar() or 0
     total_items = MenuItem.query.count()
     total_users = User.query.count()
@@ -800,10 +2565,8 @@ def admin_profile():
 @app.route('/profile/update', methods=['POST'])
 @login_required
 def update_profile():
-    user = User.query.get(session['user_id'])
-    if not user:
-        flash('User not found.')
-        return redirect(url_for('login'))
+    # The password hash is needed here, so this is the one page that loads the full row
+    user = User.query.get(g.user.id)
     
     new_username = request.form.get('username')
     current_password = request.form.get('current_password')
@@ -820,21 +2583,29 @@ def update_profile():
     
     # Check if password is being changed
     if new_password:
-        if not current_password or not check_password_hash(user.password, current_password):
-            flash('Current password is incorrect.')
-            return redirect(url_for('profile'))
-        
-        if new_password != confirm_password:
-            flash('New passwords do not match.')
+        try:
+            if not current_password or not verify_password(user.password, current_password):
+                flash('Current password is incorrect.')
+                return redirect(url_for('profile'))
+            
+            if new_password != confirm_password:
+                flash('New passwords do not match.')
+                return redirect(url_for('profile'))
+            
+            user.password = hash_password(new_password)
+        except PasswordHashingBusy:
+            flash('The server is busy. Please try changing your password again in a moment.')
             return redirect(url_for('profile'))
-        
-        user.password = generate_password_hash(new_password)
     
     db.session.commit()
+    identity_cache.invalidate(user.id)
     flash('Profile updated successfully!')
     return redirect(url_for('profile'))
 
 
+with app.app_context():
+    preload_translations()
+    warm_fragment_cache()
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
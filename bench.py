@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the request hot paths.
+Usage: python bench.py [--requests 200] [--mode client|server] [--threads 8]
+                       [--users 200 --items 40 --days 60 --orders-per-day 300]
+                       [--database load.db] [--json results.json] [--compare old.json]
+
+Seeds a throwaway SQLite database with add_sample_data.py (or reuses --database),
+then times each scenario and reports p50/p95/p99 latency, throughput, SQL
+statements per request and peak RSS. "client" mode drives the Flask test client
+in-process; "server" mode starts a threaded WSGI server on localhost and sends
+real HTTP requests from --threads concurrent clients.
+
+Save runs with --json and compare two commits with --compare:
+
+  git checkout main && python bench.py --json main.json
+  git checkout my-branch && python bench.py --compare main.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+
+SCENARIO_NAMES = ['index', 'menu', 'cart_add', 'checkout', 'orders', 'admin_dashboard', 'admin_orders']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario')
+    parser.add_argument('--mode', choices=['client', 'server'], default='client')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent clients in server mode')
+    parser.add_argument('--scenarios', default=','.join(SCENARIO_NAMES), help='comma separated subset to run')
+    parser.add_argument('--cart-lines', type=int, default=5, help='cart lines placed by each checkout')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--orders-per-day', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database', help='existing SQLite file to benchmark instead of generating one')
+    parser.add_argument('--json', dest='json_path', help='write results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to compare against')
+    return parser.parse_args()
+
+
+args = parse_args()
+
+# Must be set before app.py is imported
+if args.database:
+    _db_path = os.path.abspath(args.database)
+    _temporary_db = False
+else:
+    _db_fd, _db_path = tempfile.mkstemp(prefix='canteen-bench-', suffix='.db')
+    os.close(_db_fd)
+    _temporary_db = True
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+
+from sqlalchemy import event
+from werkzeug.serving import make_server, WSGIRequestHandler
+from app import app, db, User, MenuItem, Cart
+from add_sample_data import add_sample_data
+
+CUSTOMER = ('john_doe', 'password123')
+ADMIN = ('admin', 'admin123')
+
+
+class StatementCounter:
+    """Counts SQL statements across all threads while attached to the engine,
+    except those a thread issues while ignoring() (scenario setup)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __call__(self, *args):
+        if getattr(self._local, 'ignoring', False):
+            return
+        with self._lock:
+            self.count += 1
+
+    @contextmanager
+    def ignoring(self):
+        self._local.ignoring = True
+        try:
+            yield
+        finally:
+            self._local.ignoring = False
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args):
+        pass
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects instead of following them, like the test client does."""
+
+    def redirect_request(self, *args):
+        return None
+
+
+class Scenario:
+    def __init__(self, method, path, role='customer', setup=None, data=None):
+        self.method = method
+        self.path = path
+        self.role = role
+        self.setup = setup
+        self.data = data
+
+    def url(self, context):
+        return self.path(context) if callable(self.path) else self.path
+
+
+def fill_cart(context, username):
+    """Replace the user's cart with --cart-lines items so the next checkout has work to do."""
+    with app.app_context():
+        user_id = context['user_ids'][username]
+        Cart.query.filter_by(user_id=user_id).delete()
+        db.session.execute(Cart.__table__.insert(), [
+            {'user_id': user_id, 'item_id': item_id, 'quantity': 1, 'timestamp': datetime.utcnow()}
+            for item_id in random.sample(context['item_ids'], min(args.cart_lines, len(context['item_ids'])))
+        ])
+        db.session.commit()
+
+
+SCENARIOS = {
+    'index': Scenario('GET', '/'),
+    'menu': Scenario('GET', '/menu'),
+    'cart_add': Scenario('POST', lambda context: '/cart/add/%d' % random.choice(context['item_ids']),
+                         data={'quantity': '1'}),
+    'checkout': Scenario('POST', '/cart/checkout', setup=fill_cart),
+    'orders': Scenario('GET', '/orders'),
+    'admin_dashboard': Scenario('GET', '/admin/dashboard', role='admin'),
+    'admin_orders': Scenario('GET', '/admin/orders', role='admin'),
+}
+
+
+def prepare_dataset():
+    if not args.database:
+        print(f"🏗️  Generating dataset: {args.users} users, {args.items} items, "
+              f"{args.days} days x {args.orders_per_day} orders/day")
+        add_sample_data(users=args.users, items=args.items, days=args.days, orders_per_day=args.orders_per_day,
+                        seed=args.seed)
+    with app.app_context():
+        user_ids = dict(db.session.query(User.username, User.id))
+        item_ids = [item_id for (item_id,) in db.session.query(MenuItem.id).filter(MenuItem.available == True)]
+    # Server mode gives every thread its own customer so their carts don't collide
+    customers = [username for username in user_ids if username.startswith('student')][:args.threads - 1]
+    return {'user_ids': user_ids, 'item_ids': item_ids, 'customers': [CUSTOMER[0]] + customers}
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies, statements, elapsed, errors):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'queries_per_request': round(statements / len(latencies), 2),
+    }
+
+
+def run_client_mode(scenario, context, counter):
+    """Sequential requests through the Flask test client, logged in via the session."""
+    username = ADMIN[0] if scenario.role == 'admin' else CUSTOMER[0]
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = context['user_ids'][username]
+        sess['is_admin'] = scenario.role == 'admin'
+
+    latencies, errors, statements = [], 0, 0
+    started = time.perf_counter()
+    for n in range(args.warmup + args.requests):
+        if scenario.setup:
+            with counter.ignoring():
+                scenario.setup(context, username)
+        url = scenario.url(context)
+        before = counter.count
+        request_started = time.perf_counter()
+        response = client.open(url, method=scenario.method, data=scenario.data)
+        duration = (time.perf_counter() - request_started) * 1000
+        if n < args.warmup:
+            started = time.perf_counter()
+            continue
+        latencies.append(duration)
+        statements += counter.count - before
+        errors += response.status_code >= 400
+    return summarize(latencies, statements, time.perf_counter() - started, errors)
+
+
+def open_url(opener, request):
+    """Status code of a request, without following redirects."""
+    try:
+        with opener.open(request) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def logged_in_opener(base_url, username, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+    credentials = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    assert open_url(opener, urllib.request.Request(base_url + '/login', data=credentials)) == 302, username
+    return opener
+
+
+def run_server_mode(scenario, context, counter, base_url):
+    """--threads concurrent HTTP clients against the threaded WSGI server."""
+    if scenario.role == 'admin':
+        logins = [ADMIN] * args.threads
+    else:
+        logins = [(username, CUSTOMER[1]) for username in context['customers']]
+    openers = [(username, logged_in_opener(base_url, username, password)) for username, password in logins]
+
+    latencies, errors = [], []
+    per_thread = (args.warmup + args.requests) // len(openers) + 1
+
+    def worker(username, opener):
+        for n in range(per_thread):
+            if scenario.setup:
+                with counter.ignoring():
+                    scenario.setup(context, username)
+            url = base_url + scenario.url(context)
+            data = urllib.parse.urlencode(scenario.data or {}).encode() if scenario.method == 'POST' else None
+            request_started = time.perf_counter()
+            status = open_url(opener, urllib.request.Request(url, data=data, method=scenario.method))
+            duration = (time.perf_counter() - request_started) * 1000
+            if n >= args.warmup // len(openers):
+                latencies.append(duration)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker, args=opener) for opener in openers]
+    before = counter.count
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Statement counts include the untimed warmup requests, so scale by everything sent
+    statements = (counter.count - before) * len(latencies) / (per_thread * len(openers))
+    return summarize(latencies, statements, elapsed, len(errors))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"\n📊 {results['meta']['mode']} mode, commit {results['meta']['commit']}, "
+          f"peak RSS {results['peak_rss_mb']} MB")
+    print(f"   {'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'SQL/req':>9}{'errors':>8}")
+    for name, stats in results['scenarios'].items():
+        print(f"   {name:<16}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+              f"{stats['throughput_rps']:>9.1f}{stats['queries_per_request']:>9.2f}{stats['errors']:>8}")
+
+
+def print_comparison(results, baseline):
+    print(f"\n🔍 Compared with commit {baseline['meta'].get('commit')} ({baseline['meta'].get('mode')} mode)")
+    print(f"   {'scenario':<16}{'p50 ms':>26}{'p95 ms':>26}{'SQL/req':>22}")
+    for name, stats in results['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old:
+            continue
+        cells = []
+        for key, width in (('p50_ms', 26), ('p95_ms', 26), ('queries_per_request', 22)):
+            change = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{old[key]:.2f}→{stats[key]:.2f} ({change:+.0f}%)".rjust(width))
+        print(f"   {name:<16}" + ''.join(cells))
+
+
+def main():
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"❌ Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    context = prepare_dataset()
+    counter = StatementCounter()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter)
+
+    server = None
+    if args.mode == 'server':
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = 'http://127.0.0.1:%d' % server.server_port
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.utcnow().isoformat(timespec='seconds'),
+            'mode': args.mode,
+            'threads': args.threads if args.mode == 'server' else 1,
+            'requests': args.requests,
+            'dataset': args.database or {'users': args.users, 'items': args.items, 'days': args.days,
+                                         'orders_per_day': args.orders_per_day, 'seed': args.seed},
+            'python': platform.python_version(),
+        },
+        'scenarios': {},
+    }
+    try:
+        for name in names:
+            print(f"⏱️  {name} ...")
+            if args.mode == 'server':
+                results['scenarios'][name] = run_server_mode(SCENARIOS[name], context, counter, base_url)
+            else:
+                results['scenarios'][name] = run_client_mode(SCENARIOS[name], context, counter)
+            results['scenarios'][name]['peak_rss_mb'] = peak_rss_mb()
+    finally:
+        if server:
+            server.shutdown()
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        if _temporary_db:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(_db_path + suffix):
+                    os.remove(_db_path + suffix)
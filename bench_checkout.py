@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark checkout latency for large carts.
+Usage: python bench_checkout.py [--lines 60] [--runs 30]
+
+Runs against a throwaway SQLite database, never canteen.db.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+# Must be set before app.py is imported
+_db_fd, _db_path = tempfile.mkstemp(prefix='canteen-bench-', suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+
+from sqlalchemy import event
+from app import app, db, User, MenuItem, Cart, MEAL_SHIFTS
+
+
+def seed(lines):
+    """Create one customer and enough menu items to fill a cart of the given size"""
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', password='x')
+        db.session.add(user)
+        db.session.add_all([
+            MenuItem(name=f'Item {i}', description='', price=20 + i, shift=MEAL_SHIFTS[i % len(MEAL_SHIFTS)])
+            for i in range(lines)
+        ])
+        db.session.commit()
+        return user.id, [item.id for item in MenuItem.query.all()]
+
+
+def fill_cart(user_id, item_ids):
+    with app.app_context():
+        db.session.execute(Cart.__table__.insert(), [
+            {'user_id': user_id, 'item_id': item_id, 'quantity': 2} for item_id in item_ids
+        ])
+        db.session.commit()
+
+
+def run_benchmark(lines, runs):
+    user_id, item_ids = seed(lines)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    timings = []
+    query_counts = []
+    for _ in range(runs):
+        fill_cart(user_id, item_ids)
+        del statements[:]
+        started = time.perf_counter()
+        response = client.post('/cart/checkout')
+        timings.append((time.perf_counter() - started) * 1000)
+        query_counts.append(len(statements))
+        assert response.status_code == 302, response.status_code
+
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"📦 Checkout with {lines} line items, {runs} runs")
+    print(f"   median: {statistics.median(timings):.2f} ms")
+    print(f"   p95:    {p95:.2f} ms")
+    print(f"   max:    {timings[-1]:.2f} ms")
+    print(f"   SQL statements per checkout: {max(query_counts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=60, help='cart line items per checkout')
+    parser.add_argument('--runs', type=int, default=30, help='number of checkouts to time')
+    args = parser.parse_args()
+    try:
+        run_benchmark(args.lines, args.runs)
+    finally:
+        os.remove(_db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark template rendering per language.
+Usage: python bench_translations.py [--runs 200] [--languages en,bn]
+
+Renders every page served from the page cache with its full content block
+(no fragment cache), in each language, against a throwaway SQLite database
+seeded by add_sample_data.py. Also times loading each compiled catalog, the
+cost that preload_translations() moves to startup.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+# Must be set before app.py is imported
+_db_fd, _db_path = tempfile.mkstemp(prefix='canteen-bench-', suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+
+from babel.support import Translations
+from flask import render_template
+from app import app, babel, CACHED_PAGES
+from add_sample_data import add_sample_data
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def time_catalog_loads(languages, runs):
+    directory = next(iter(babel.translation_directories))
+    print("📚 Loading compiled catalogs from disk (per request without preloading)")
+    for code in languages:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            Translations.load(directory, [code], app.config['BABEL_DOMAIN'])
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"   {code}: median {statistics.median(timings):.3f} ms")
+
+
+def time_renders(languages, runs):
+    print(f"🖌️  Rendering pages, {runs} runs each")
+    print(f"   {'page':<16}" + ''.join(f"{code + ' p50':>10}{code + ' p95':>10}" for code in languages))
+    for template_name, (_, load_context) in CACHED_PAGES.items():
+        row = f"   {template_name:<16}"
+        for code in languages:
+            with app.test_request_context(headers={'Accept-Language': code}):
+                context = load_context()
+                render_template(template_name, **context)
+                timings = []
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    render_template(template_name, **context)
+                    timings.append((time.perf_counter() - started) * 1000)
+            row += f"{statistics.median(timings):>10.2f}{percentile(timings, 0.95):>10.2f}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=200, help='renders per page and language')
+    parser.add_argument('--languages', default=','.join(app.config['LANGUAGES']), help='comma-separated language codes')
+    args = parser.parse_args()
+    languages = args.languages.split(',')
+    try:
+        add_sample_data(items=24)
+        time_catalog_loads(languages, args.runs)
+        time_renders(languages, args.runs)
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(_db_path + suffix):
+                os.remove(_db_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
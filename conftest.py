@@ -0,0 +1,90 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# Point app.py at a throwaway database before any test module imports it,
+# so the test run never touches canteen.db.
+_db_fd, _db_path = tempfile.mkstemp(prefix='canteen-test-', suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ['FLASK_ENV'] = 'testing'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+
+
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    """Tests recreate the schema, so user ids are reused with different users."""
+    from app import identity_cache
+    identity_cache.clear()
+    yield
+
+
+@pytest.fixture
+def fresh_db():
+    """Empty schema and empty in-process caches, for tests that seed their own rows."""
+    from app import app, db, _fragment_cache, _menu_api_cache, _sales_day_cache, _sales_report_cache
+    for cache in (_fragment_cache, _menu_api_cache, _sales_day_cache, _sales_report_cache):
+        cache.clear()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+
+@pytest.fixture
+def shop(fresh_db):
+    """An admin, a customer and one lunch item (Khichuri at 60); returns their ids."""
+    from app import app, db, User, MenuItem
+    with app.app_context():
+        admin = User(username='admin', password='x', is_admin=True)
+        customer = User(username='customer', password='x')
+        item = MenuItem(name='Khichuri', description='', price=60, shift='lunch')
+        db.session.add_all([admin, customer, item])
+        db.session.commit()
+        ids = {'admin_id': admin.id, 'customer_id': customer.id, 'item_id': item.id}
+    return ids
+
+
+def client_for(user_id, is_admin=False):
+    """Test client whose session is logged in as the given user."""
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['is_admin'] = is_admin
+    return client
+
+
+class QueryCounter:
+    """Collects every statement sent to the database while active."""
+
+    def __init__(self):
+        self.statements = []
+        self.executions = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.executions.append((statement, parameters, executemany))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    from app import app, db
+    counter = QueryCounter()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
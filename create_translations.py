@@ -3,6 +3,7 @@
 import os
 from babel.messages import Catalog
 from babel.messages.pofile import write_po
+from babel.messages.mofile import write_mo
 from babel.messages.extract import extract_from_dir
 
 # Extract messages
@@ -55,4 +56,9 @@ bn_catalog.add('বাংলা', string='বাংলা')
 with open('translations/bn/LC_MESSAGES/messages.po', 'wb') as f:
     write_po(f, bn_catalog, locale='bn')
 
+# Compile both, so the .mo files Flask-Babel loads always match the .po files
+for code, compiled_catalog in (('en', en_catalog), ('bn', bn_catalog)):
+    with open('translations/%s/LC_MESSAGES/messages.mo' % code, 'wb') as f:
+        write_mo(f, compiled_catalog)
+
 print("Translation files created successfully!")
\ No newline at end of file
@@ -10,11 +10,20 @@ Commands:
   downgrade - Rollback last migration
   current   - Show current migration
   history   - Show migration history
+  rebuild-ratings - Recompute menu item rating summaries from feedback
+  rebuild-rollups - Recompute daily sales rollups and all-time totals from order history
+  rebuild-user-stats - Reconcile per-customer order counters with order history
+  archive   - Archive old finished orders, delete abandoned carts and old order events [days]
+  pragmas   - Show configured vs effective SQLite pragmas
+  image-variants - Generate resized JPEG/WebP copies of menu images
+  translations - Compile translations/*/LC_MESSAGES/messages.po to .mo
 """
 
 import sys
 from flask_migrate import init, migrate, upgrade, downgrade, current, history
-from app import app, db
+from app import (app, db, rebuild_rating_summaries, rebuild_sales_rollups, rebuild_user_stats, sqlite_pragma_report,
+                 generate_missing_image_variants, compile_translations, archive_orders, prune_stale_carts,
+                 prune_order_events)
 
 def show_help():
     """Display help information"""
@@ -75,6 +84,80 @@ def run_history():
         except Exception as e:
             print(f"❌ Error getting migration history: {str(e)}")
 
+def run_rebuild_ratings():
+    """Recompute menu item rating summaries"""
+    with app.app_context():
+        try:
+            rebuilt = rebuild_rating_summaries()
+            print(f"✅ Rebuilt rating summaries for {rebuilt} menu items!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding rating summaries: {str(e)}")
+
+def run_rebuild_rollups():
+    """Recompute daily sales rollups and all-time totals"""
+    with app.app_context():
+        try:
+            rebuilt = rebuild_sales_rollups()
+            print(f"✅ Rebuilt {rebuilt} daily sales rollup rows!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding sales rollups: {str(e)}")
+
+def run_rebuild_user_stats():
+    """Reconcile per-customer order counters"""
+    with app.app_context():
+        try:
+            customers, wrong = rebuild_user_stats()
+            print(f"✅ Rebuilt order counters for {customers} customers ({wrong} were out of date)!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding user stats: {str(e)}")
+
+def run_archive(days=None):
+    """Move old finished orders to the archive tables and prune abandoned carts and old order events"""
+    with app.app_context():
+        try:
+            archived = archive_orders(int(days) if days else None)
+            print(f"✅ Archived {archived} orders!")
+            removed = prune_stale_carts()
+            print(f"✅ Removed {removed} abandoned cart lines!")
+            pruned = prune_order_events()
+            print(f"✅ Removed {pruned} old order events!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error archiving orders: {str(e)}")
+
+def run_pragmas():
+    """Show configured vs effective SQLite pragmas"""
+    with app.app_context():
+        try:
+            report = sqlite_pragma_report()
+            if not report:
+                print("Database is not SQLite; no pragmas applied.")
+            print(f"Profile: {app.config['ENV']}")
+            for name, (configured, effective) in report.items():
+                print(f"  {name:<14} configured={configured!s:<10} effective={effective}")
+        except Exception as e:
+            print(f"❌ Error reading pragmas: {str(e)}")
+
+def run_image_variants():
+    """Generate missing resized copies of menu images"""
+    with app.app_context():
+        try:
+            generated = generate_missing_image_variants()
+            print(f"✅ Generated variants for {generated} images!")
+        except Exception as e:
+            print(f"❌ Error generating image variants: {str(e)}")
+
+def run_translations():
+    """Compile translation catalogs"""
+    try:
+        compiled = compile_translations()
+        print(f"✅ Compiled translations for: {', '.join(compiled)}")
+    except Exception as e:
+        print(f"❌ Error compiling translations: {str(e)}")
+
 def main():
     """Main function to handle command line arguments"""
     if len(sys.argv) < 2:
@@ -98,6 +181,21 @@ def main():
         run_current()
     elif command == 'history':
         run_history()
+    elif command == 'rebuild-ratings':
+        run_rebuild_ratings()
+    elif command == 'rebuild-rollups':
+        run_rebuild_rollups()
+    elif command == 'rebuild-user-stats':
+        run_rebuild_user_stats()
+    elif command == 'archive':
+        days = sys.argv[2] if len(sys.argv) > 2 else None
+        run_archive(days)
+    elif command == 'pragmas':
+        run_pragmas()
+    elif command == 'image-variants':
+        run_image_variants()
+    elif command == 'translations':
+        run_translations()
     else:
         print(f"❌ Unknown command: {command}")
         show_help()
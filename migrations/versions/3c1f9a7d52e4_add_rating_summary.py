@@ -0,0 +1,52 @@
+"""Add rating summary table
+
+Revision ID: 3c1f9a7d52e4
+Revises: 8e30e7bf498e
+Create Date: 2026-10-17 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d52e4'
+down_revision = '8e30e7bf498e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    bind = op.get_bind()
+    if 'rating_summary' not in sa.inspect(bind).get_table_names():
+        op.create_table('rating_summary',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Integer(), nullable=False),
+        sa.Column('rating_count', sa.Integer(), nullable=False),
+        sa.Column('stars_1', sa.Integer(), nullable=False),
+        sa.Column('stars_2', sa.Integer(), nullable=False),
+        sa.Column('stars_3', sa.Integer(), nullable=False),
+        sa.Column('stars_4', sa.Integer(), nullable=False),
+        sa.Column('stars_5', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['menu_item.id'], ),
+        sa.PrimaryKeyConstraint('item_id')
+        )
+    # Backfill from existing feedback
+    if bind.execute(sa.text('SELECT COUNT(*) FROM rating_summary')).scalar():
+        return
+    op.execute(
+        'INSERT INTO rating_summary '
+        '(item_id, rating_sum, rating_count, stars_1, stars_2, stars_3, stars_4, stars_5) '
+        'SELECT item_id, SUM(rating), COUNT(id), '
+        'SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END), '
+        'SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END) '
+        'FROM feedback GROUP BY item_id'
+    )
+
+
+def downgrade():
+    op.drop_table('rating_summary')
@@ -0,0 +1,35 @@
+"""Add order indexes for keyset pagination
+
+Revision ID: 5b8e2c940d13
+Revises: a41d0e6b9f27
+Create Date: 2026-10-17 11:20:07.553901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2c940d13'
+down_revision = 'a41d0e6b9f27'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_order_timestamp_id', ['timestamp', 'id']),
+    ('ix_order_status_timestamp_id', ['status', 'timestamp', 'id']),
+    ('ix_order_meal_shift_timestamp_id', ['meal_shift', 'timestamp', 'id']),
+]
+
+
+def upgrade():
+    # db.create_all() creates these for fresh databases, so skip existing ones
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('order')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'order', columns, unique=False)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='order')
@@ -0,0 +1,63 @@
+"""Add daily sales rollup tables
+
+Revision ID: a41d0e6b9f27
+Revises: 3c1f9a7d52e4
+Create Date: 2026-10-17 10:03:54.118290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41d0e6b9f27'
+down_revision = '3c1f9a7d52e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the tables may already exist
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+    if 'sales_rollup' not in tables:
+        op.create_table('sales_rollup',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('meal_shift', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'meal_shift', 'status')
+        )
+    if 'item_sales_rollup' not in tables:
+        op.create_table('item_sales_rollup',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('meal_shift', sa.String(length=20), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['menu_item.id'], ),
+        sa.PrimaryKeyConstraint('day', 'meal_shift', 'item_id')
+        )
+    # Backfill from existing orders
+    if bind.execute(sa.text('SELECT COUNT(*) FROM sales_rollup')).scalar():
+        return
+    op.execute(
+        'INSERT INTO sales_rollup (day, meal_shift, status, order_count, revenue) '
+        'SELECT date(o.timestamp), o.meal_shift, o.status, COUNT(DISTINCT o.id), '
+        'COALESCE(SUM(oi.quantity * oi.unit_price), 0) '
+        'FROM "order" o LEFT OUTER JOIN order_item oi ON o.id = oi.order_id '
+        'GROUP BY date(o.timestamp), o.meal_shift, o.status'
+    )
+    op.execute(
+        'INSERT INTO item_sales_rollup (day, meal_shift, item_id, quantity, revenue) '
+        'SELECT date(o.timestamp), o.meal_shift, oi.item_id, SUM(oi.quantity), '
+        'SUM(oi.quantity * oi.unit_price) '
+        'FROM order_item oi JOIN "order" o ON o.id = oi.order_id '
+        'GROUP BY date(o.timestamp), o.meal_shift, oi.item_id'
+    )
+
+
+def downgrade():
+    op.drop_table('item_sales_rollup')
+    op.drop_table('sales_rollup')
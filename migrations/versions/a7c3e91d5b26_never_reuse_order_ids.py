@@ -0,0 +1,50 @@
+"""Never reuse order and order line ids on SQLite
+
+Revision ID: a7c3e91d5b26
+Revises: f3a92c6e18d4
+Create Date: 2026-10-18 10:14:52.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91d5b26'
+down_revision = 'f3a92c6e18d4'
+branch_labels = None
+depends_on = None
+
+# Hot table -> archive table whose ids the hot table must never hand out again
+ARCHIVED_IDS = {'order': 'archived_order', 'order_item': 'archived_order_item'}
+
+
+def upgrade():
+    # Without AUTOINCREMENT SQLite hands out max(id) + 1, which can be the id of
+    # an archived row. Other databases use sequences that never go backwards.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table, archive in ARCHIVED_IDS.items():
+        # db.create_all() may already have created the table with AUTOINCREMENT
+        sql = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': table}).scalar()
+        if 'AUTOINCREMENT' not in sql.upper():
+            with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+                pass
+        # Start the counter above every id ever used, archived ids included
+        highest = bind.execute(sa.text(
+            'SELECT max(id) FROM (SELECT id FROM "%s" UNION ALL SELECT id FROM %s '
+            'UNION ALL SELECT seq FROM sqlite_sequence WHERE name = :name)' % (table, archive)
+        ), {'name': table}).scalar() or 0
+        bind.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table})
+        bind.execute(sa.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table, 'seq': highest})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ARCHIVED_IDS:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -0,0 +1,48 @@
+"""Add per-customer order counters
+
+Revision ID: b6d41e8a9c37
+Revises: e2b94c7a1f05
+Create Date: 2026-10-17 17:21:09.534018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d41e8a9c37'
+down_revision = 'e2b94c7a1f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    bind = op.get_bind()
+    if 'user_stats' not in sa.inspect(bind).get_table_names():
+        op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('pending_count', sa.Integer(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False),
+        sa.Column('total_spent', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+    # Backfill from existing orders
+    if bind.execute(sa.text('SELECT COUNT(*) FROM user_stats')).scalar():
+        return
+    op.execute(
+        'INSERT INTO user_stats (user_id, order_count, pending_count, completed_count, cancelled_count, total_spent) '
+        'SELECT user_id, COUNT(id), '
+        "SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END), "
+        "COALESCE(SUM(CASE WHEN status = 'completed' THEN total_amount ELSE 0 END), 0) "
+        'FROM "order" GROUP BY user_id'
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
@@ -0,0 +1,39 @@
+"""Add order events for the order streams
+
+Revision ID: b6e48d1f2a97
+Revises: d41c7b2e9f63
+Create Date: 2026-10-18 15:37:42.180934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e48d1f2a97'
+down_revision = 'd41c7b2e9f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    if 'order_event' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('order_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('event', sa.String(length=20), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+        )
+        op.create_index('ix_order_event_timestamp', 'order_event', ['timestamp'], unique=False)
+        op.create_index('ix_order_event_user_id_id', 'order_event', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_event_user_id_id', table_name='order_event')
+    op.drop_index('ix_order_event_timestamp', table_name='order_event')
+    op.drop_table('order_event')
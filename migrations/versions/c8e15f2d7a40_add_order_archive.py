@@ -0,0 +1,53 @@
+"""Add archive tables for finished orders
+
+Revision ID: c8e15f2d7a40
+Revises: b6d41e8a9c37
+Create Date: 2026-10-17 18:02:47.915361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e15f2d7a40'
+down_revision = 'b6d41e8a9c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the tables may already exist.
+    # Nothing is archived until `python manage_db.py archive` runs.
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'archived_order' not in tables:
+        op.create_table('archived_order',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('meal_shift', sa.String(length=20), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_archived_order_user_id_timestamp', 'archived_order', ['user_id', 'timestamp'], unique=False)
+    if 'archived_order_item' not in tables:
+        op.create_table('archived_order_item',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['menu_item.id'], ),
+        sa.ForeignKeyConstraint(['order_id'], ['archived_order.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_archived_order_item_order_id'), 'archived_order_item', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_archived_order_item_order_id'), table_name='archived_order_item')
+    op.drop_table('archived_order_item')
+    op.drop_index('ix_archived_order_user_id_timestamp', table_name='archived_order')
+    op.drop_table('archived_order')
@@ -0,0 +1,55 @@
+"""Add all-time sales totals per status and per menu item
+
+Revision ID: d41c7b2e9f63
+Revises: a7c3e91d5b26
+Create Date: 2026-10-18 11:02:19.407561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7b2e9f63'
+down_revision = 'a7c3e91d5b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the tables may already exist
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+    if 'sales_total' not in tables:
+        op.create_table('sales_total',
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('status')
+        )
+    if 'item_sales_total' not in tables:
+        op.create_table('item_sales_total',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['menu_item.id'], ),
+        sa.PrimaryKeyConstraint('item_id')
+        )
+        op.create_index('ix_item_sales_total_quantity', 'item_sales_total', ['quantity'], unique=False)
+    # Backfill from the rollups
+    if not bind.execute(sa.text('SELECT COUNT(*) FROM sales_total')).scalar():
+        op.execute(
+            'INSERT INTO sales_total (status, order_count, revenue) '
+            'SELECT status, SUM(order_count), SUM(revenue) FROM sales_rollup GROUP BY status'
+        )
+    if not bind.execute(sa.text('SELECT COUNT(*) FROM item_sales_total')).scalar():
+        op.execute(
+            'INSERT INTO item_sales_total (item_id, quantity, revenue) '
+            'SELECT item_id, SUM(quantity), SUM(revenue) FROM item_sales_rollup GROUP BY item_id'
+        )
+
+
+def downgrade():
+    op.drop_index('ix_item_sales_total_quantity', table_name='item_sales_total')
+    op.drop_table('item_sales_total')
+    op.drop_table('sales_total')
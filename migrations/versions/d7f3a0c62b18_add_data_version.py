@@ -0,0 +1,31 @@
+"""Add data version counters for the page fragment cache
+
+Revision ID: d7f3a0c62b18
+Revises: 5b8e2c940d13
+Create Date: 2026-10-17 13:42:31.207415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f3a0c62b18'
+down_revision = '5b8e2c940d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist.
+    # Missing rows read as version 0, so there is nothing to backfill.
+    if 'data_version' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('data_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,40 @@
+"""Add indexes for order history, order lines, feedback and notices
+
+Revision ID: e2b94c7a1f05
+Revises: d7f3a0c62b18
+Create Date: 2026-10-17 15:08:44.610392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94c7a1f05'
+down_revision = 'd7f3a0c62b18'
+branch_labels = None
+depends_on = None
+
+# Cart.user_id is already covered by the (user_id, item_id) unique constraint
+# and Order.status by ix_order_status_timestamp_id.
+INDEXES = [
+    ('ix_order_user_id_timestamp', 'order', ['user_id', 'timestamp']),
+    ('ix_order_item_order_id', 'order_item', ['order_id']),
+    ('ix_order_item_item_id', 'order_item', ['item_id']),
+    ('ix_feedback_user_id', 'feedback', ['user_id']),
+    ('ix_feedback_item_id', 'feedback', ['item_id']),
+    ('ix_notice_timestamp', 'notice', ['timestamp']),
+]
+
+
+def upgrade():
+    # db.create_all() creates these for fresh databases, so skip existing ones
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,32 @@
+"""Add per-day change counters for cached sales reports
+
+Revision ID: f3a92c6e18d4
+Revises: c8e15f2d7a40
+Create Date: 2026-10-17 19:26:08.531942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a92c6e18d4'
+down_revision = 'c8e15f2d7a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist.
+    # Missing rows read as version 0 and report caches start empty, so there is
+    # nothing to backfill.
+    if 'sales_day_version' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('sales_day_version',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+        )
+
+
+def downgrade():
+    op.drop_table('sales_day_version')
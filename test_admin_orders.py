@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Admin order list tests: keyset pages walk every order exactly once, even when
+orders share a timestamp, and keep their filters and page size from page to page.
+"""
+
+import html
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db, Order, OrderItem
+from conftest import client_for
+
+NOON = datetime(2026, 9, 7, 12, 0)
+
+
+@pytest.fixture
+def orders(shop):
+    """Nine orders over three days; three of them placed in the same second."""
+    with app.app_context():
+        for offset in [timedelta(0)] * 3 + [timedelta(minutes=n) for n in (5, 10)] + \
+                      [timedelta(days=1), timedelta(days=1, hours=1), timedelta(days=2), timedelta(days=2, hours=1)]:
+            order = Order(user_id=shop['customer_id'], meal_shift='lunch', status='pending',
+                          timestamp=NOON + offset, total_amount=60)
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, item_id=shop['item_id'], quantity=1, unit_price=60))
+        db.session.commit()
+        newest_first = [order.id for order in Order.query.order_by(Order.timestamp.desc(), Order.id.desc())]
+    return dict(shop, newest_first=newest_first)
+
+
+def order_ids(page):
+    return [int(order_id) for order_id in re.findall(r'#(\d+)</span>', page)]
+
+
+def older_link(page):
+    match = re.search(r'href="([^"]+)"\s+class="[^"]*">\s*Older orders', page)
+    return html.unescape(match.group(1)) if match else None
+
+
+def walk_pages(client, url):
+    """Order ids of every page, following the "Older orders" links from url."""
+    pages = []
+    while url:
+        page = client.get(url).get_data(as_text=True)
+        pages.append(order_ids(page))
+        url = older_link(page)
+    return pages
+
+
+def test_pages_cover_every_order_once(orders):
+    client = client_for(orders['admin_id'], is_admin=True)
+    pages = walk_pages(client, '/admin/orders?per_page=2')
+
+    # per_page survives into every "Older orders" link
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+    assert [order_id for page in pages for order_id in page] == orders['newest_first']
+
+
+def test_filters_are_kept_across_pages(orders):
+    client = client_for(orders['admin_id'], is_admin=True)
+    pages = walk_pages(client, '/admin/orders?per_page=2&date_from=2026-09-07&date_to=2026-09-07')
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [order_id for page in pages for order_id in page] == orders['newest_first'][4:]
+
+    page = client.get('/admin/orders?date_from=2026-09-08').get_data(as_text=True)
+    assert order_ids(page) == orders['newest_first'][:4]
+
+
+@pytest.mark.parametrize('cursor', ['garbage', '2026-09-07T12:00:00_x', '_5'])
+def test_malformed_cursor_shows_the_newest_page(orders, cursor):
+    client = client_for(orders['admin_id'], is_admin=True)
+    response = client.get('/admin/orders', query_string={'cursor': cursor, 'per_page': 3})
+    assert response.status_code == 200
+    assert order_ids(response.get_data(as_text=True)) == orders['newest_first'][:3]
+
+
+def test_malformed_dates_are_ignored(orders):
+    client = client_for(orders['admin_id'], is_admin=True)
+    response = client.get('/admin/orders', query_string={'date_from': '2026-13-01', 'date_to': 'soon'})
+    assert response.status_code == 200
+    assert order_ids(response.get_data(as_text=True)) == orders['newest_first']
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Archival tests: old finished orders move to the archive tables in batches and
+stay readable, rollups rebuild from both, and abandoned carts are pruned.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (app, db, User, Order, OrderItem, Cart, ArchivedOrder, ArchivedOrderItem,
+                 SalesRollup, archive_orders, prune_stale_carts, rebuild_sales_rollups, rebuild_user_stats)
+from conftest import client_for
+
+
+@pytest.fixture
+def history(shop):
+    """A customer with orders from 400 days ago up to today, in every status."""
+    with app.app_context():
+        other = User(username='other', password='x')
+        db.session.add(other)
+        db.session.flush()
+        now = datetime.utcnow()
+        for days_ago, status in [(400, 'completed'), (300, 'cancelled'), (250, 'completed'), (200, 'pending'),
+                                 (190, 'completed'), (10, 'completed'), (1, 'pending')]:
+            order = Order(user_id=shop['customer_id'], meal_shift='lunch', status=status,
+                          timestamp=now - timedelta(days=days_ago), total_amount=120)
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, item_id=shop['item_id'], quantity=2, unit_price=60))
+        db.session.commit()
+        rebuild_sales_rollups()
+        rebuild_user_stats()
+        other_id = other.id
+    return dict(shop, other_id=other_id)
+
+
+def test_archives_only_old_finished_orders_in_batches(history):
+    with app.app_context():
+        assert archive_orders(older_than_days=180, batch_size=2) == 4
+        assert {order.status for order in ArchivedOrder.query} == {'completed', 'cancelled'}
+        assert ArchivedOrderItem.query.count() == 4
+        # The old pending order is still open, so it stays
+        assert Order.query.count() == 3
+        assert OrderItem.query.count() == 3
+        assert archive_orders(older_than_days=180) == 0
+
+
+def test_archived_ids_are_never_reused(history):
+    with app.app_context():
+        Order.query.update({'status': 'completed', 'timestamp': datetime.utcnow() - timedelta(days=365)})
+        db.session.commit()
+        newest_order = db.session.query(db.func.max(Order.id)).scalar()
+        newest_line = db.session.query(db.func.max(OrderItem.id)).scalar()
+        # Even the newest order goes, so a quiet shop can archive everything
+        assert archive_orders(older_than_days=180) == 7
+        assert Order.query.count() == 0
+
+        order = Order(user_id=history['customer_id'], meal_shift='lunch', total_amount=60)
+        db.session.add(order)
+        db.session.flush()
+        line = OrderItem(order_id=order.id, item_id=history['item_id'], quantity=1, unit_price=60)
+        db.session.add(line)
+        db.session.commit()
+        assert order.id > newest_order
+        assert line.id > newest_line
+
+
+def test_rollups_and_stats_include_the_archive(history):
+    with app.app_context():
+        before = sorted((row.day, row.status, row.order_count, row.revenue) for row in SalesRollup.query)
+        archive_orders(older_than_days=180)
+        rebuild_sales_rollups()
+        after = sorted((row.day, row.status, row.order_count, row.revenue) for row in SalesRollup.query)
+        assert after == before
+        assert rebuild_user_stats() == (1, 0)
+
+
+def test_archived_orders_stay_readable(history):
+    with app.app_context():
+        archive_orders(older_than_days=180)
+    client = client_for(history['customer_id'])
+    page = client.get('/orders/archive').get_data(as_text=True)
+    assert page.count('Lunch Order') == 4
+    assert client.get('/orders').get_data(as_text=True).count('Lunch Order') == 3
+    assert client_for(history['other_id']).get('/orders/archive').get_data(as_text=True).count('Lunch Order') == 0
+
+
+def test_prunes_only_abandoned_carts(history):
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.add_all([
+            Cart(user_id=history['customer_id'], item_id=history['item_id'], quantity=1,
+                 timestamp=now - timedelta(days=30)),
+            Cart(user_id=history['other_id'], item_id=history['item_id'], quantity=1,
+                 timestamp=now - timedelta(days=1)),
+        ])
+        db.session.commit()
+        assert prune_stale_carts(older_than_days=14) == 1
+        assert [cart.user_id for cart in Cart.query] == [history['other_id']]
+
+
+def test_touching_a_cart_line_keeps_it(history):
+    client = client_for(history['customer_id'])
+    with app.app_context():
+        db.session.add(Cart(user_id=history['customer_id'], item_id=history['item_id'], quantity=1,
+                            timestamp=datetime.utcnow() - timedelta(days=30)))
+        db.session.commit()
+    client.post(f"/cart/add/{history['item_id']}", data={'quantity': 1})
+    with app.app_context():
+        assert prune_stale_carts(older_than_days=14) == 0
+
+
+def test_pruned_cart_clears_the_cached_badge(history):
+    client = client_for(history['customer_id'])
+    client.post(f"/cart/add/{history['item_id']}", data={'quantity': 1})
+    client.get('/orders')
+    with client.session_transaction() as sess:
+        assert sess['cart_count'] == 1
+        # The customer comes back after the retention period
+        sess['cart_touched'] -= 15 * 24 * 60 * 60
+    with app.app_context():
+        Cart.query.update({'timestamp': datetime.utcnow() - timedelta(days=15)})
+        db.session.commit()
+        assert prune_stale_carts() == 1
+
+    assert client.get('/orders').status_code == 200
+    with client.session_transaction() as sess:
+        assert sess['cart_count'] == 0
+
+
+def test_badge_survives_a_batch_that_nets_to_zero(history):
+    client = client_for(history['customer_id'])
+    # The badge is counted while the cart is still empty
+    assert client.get('/orders').status_code == 200
+    with app.app_context():
+        db.session.add(Cart(user_id=history['customer_id'], item_id=history['item_id'], quantity=1))
+        db.session.commit()
+
+    response = client.post('/cart/batch', json={'operations': [
+        {'item_id': history['item_id'], 'delta': 1}, {'item_id': history['item_id'], 'delta': -1}]})
+    assert response.get_json()['cart_count'] == 1
+    assert client.get('/orders').status_code == 200
+    with client.session_transaction() as sess:
+        assert sess['cart_count'] == 1
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Identity tests: the logged-in user is loaded once per request into g.user
+from a TTL/LRU cache that update_profile() invalidates.
+"""
+
+import re
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db, User, IdentityCache, Identity, identity_cache, hash_password
+from conftest import client_for
+
+
+@pytest.fixture
+def users(fresh_db):
+    with app.app_context():
+        admin = User(username='admin', password='x', is_admin=True)
+        customer = User(username='customer', password=hash_password('secret'))
+        db.session.add_all([admin, customer])
+        db.session.commit()
+        ids = {'admin_id': admin.id, 'customer_id': customer.id}
+    return ids
+
+
+def user_queries(client, url):
+    """SQL statements reading the user table while fetching url."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return [statement for statement in statements if re.search(r'FROM user\b', statement)]
+
+
+def test_user_is_loaded_once_then_cached(users):
+    client = client_for(users['customer_id'])
+    assert len(user_queries(client, '/profile')) == 1
+    assert user_queries(client, '/profile') == []
+    assert user_queries(client, '/orders') == []
+
+
+def test_update_profile_invalidates_identity(users):
+    client = client_for(users['customer_id'])
+    client.get('/profile')
+    response = client.post('/profile/update', data={'username': 'renamed'})
+    assert response.status_code == 302
+    assert 'renamed' in client.get('/profile').get_data(as_text=True)
+
+
+def test_revoked_admin_loses_access_when_entry_expires(users, monkeypatch):
+    client = client_for(users['admin_id'], is_admin=True)
+    assert client.get('/admin/profile').status_code == 200
+    with app.app_context():
+        User.query.filter_by(id=users['admin_id']).update({'is_admin': False})
+        db.session.commit()
+
+    # Still cached: the TTL bounds how long a revoked admin keeps access
+    assert client.get('/admin/profile').status_code == 200
+    monkeypatch.setattr(identity_cache, 'ttl', 0)
+    identity_cache.invalidate(users['admin_id'])
+    assert client.get('/admin/profile').status_code == 302
+    with client.session_transaction() as sess:
+        assert sess['is_admin'] is False
+
+
+def test_session_of_deleted_user_is_dropped(users):
+    client = client_for(users['customer_id'])
+    with app.app_context():
+        User.query.filter_by(id=users['customer_id']).delete()
+        db.session.commit()
+    response = client.get('/profile')
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+
+def test_cache_evicts_least_recently_used():
+    cache = IdentityCache(max_size=2, ttl=60)
+    cache.put(1, Identity(1, 'a', False))
+    cache.put(2, Identity(2, 'b', False))
+    assert cache.get(1) == (True, Identity(1, 'a', False))
+    cache.put(3, Identity(3, 'c', False))
+    assert cache.get(2) == (False, None)
+    assert cache.get(1)[0] and cache.get(3)[0]
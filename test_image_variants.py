@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Upload image tests: uploads are stored under their content hash with resized
+copies next to them, served through srcset with immutable cache headers, and
+removed once no menu item references them.
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app import (app, db, MenuItem, image_variants, save_uploaded_image, remove_image_files,
+                 generate_missing_image_variants, IMAGE_VARIANT_FORMATS, _image_variant_cache)
+from conftest import client_for
+
+
+def png_bytes(size=(800, 400), color=(255, 0, 0, 128)):
+    buf = io.BytesIO()
+    Image.new('RGBA', size, color).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+class FakeUpload:
+    """Minimal stand-in for a werkzeug FileStorage."""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+@pytest.fixture
+def upload_root(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'static' / 'uploads')
+    monkeypatch.setattr(app, 'root_path', str(tmp_path))
+    return tmp_path
+
+
+def test_variants_are_resized_without_upscaling(upload_root):
+    data = png_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    image_path = save_uploaded_image(FakeUpload('Dish.PNG', data))
+    assert image_path == f'static/uploads/{digest}.png'
+
+    for variant, max_width in app.config['IMAGE_VARIANTS'].items():
+        for ext in IMAGE_VARIANT_FORMATS:
+            with Image.open(upload_root / 'static' / 'uploads' / f'{digest}_{variant}.{ext}') as resized:
+                assert resized.size == (min(max_width, 800), min(max_width, 800) // 2)
+
+    variants = image_variants(image_path)
+    assert variants['src'] == f'/static/uploads/{digest}_card.jpg'
+    assert f'/static/uploads/{digest}_thumb.jpg 160w' in variants['jpg']
+
+    remove_image_files(image_path)
+    assert os.listdir(upload_root / 'static' / 'uploads') == []
+    assert image_variants(image_path)['src'] == f'/static/uploads/{digest}.png'
+
+
+def test_identical_uploads_share_one_file(upload_root):
+    data = png_bytes()
+    first = save_uploaded_image(FakeUpload('lunch.png', data))
+    second = save_uploaded_image(FakeUpload('dinner.png', data))
+    other = save_uploaded_image(FakeUpload('lunch.png', png_bytes(color=(0, 0, 255, 255))))
+    assert first == second
+    assert other != first
+    originals = [name for name in os.listdir(upload_root / 'static' / 'uploads') if name.endswith('.png')]
+    assert len(originals) == 2
+
+
+def test_images_without_variants_fall_back_to_original(upload_root, monkeypatch):
+    assert image_variants('static/uploads/legacy.png') == {
+        'src': '/static/uploads/legacy.png', 'jpg': None, 'webp': None,
+    }
+    # The missing variants are remembered, so rendering doesn't stat the disk again
+    checked = []
+    monkeypatch.setattr(os.path, 'exists', lambda path: checked.append(path) or False)
+    assert image_variants('static/uploads/legacy.png')['src'] == '/static/uploads/legacy.png'
+    assert checked == []
+
+
+@pytest.mark.parametrize('data', [b'not an image at all', png_bytes()[:200]])
+def test_invalid_uploads_leave_nothing_on_disk(upload_root, data):
+    with pytest.raises(ValueError):
+        save_uploaded_image(FakeUpload('dish.png', data))
+    assert os.listdir(upload_root / 'static' / 'uploads') == []
+
+
+@pytest.fixture
+def admin_client(shop):
+    return client_for(shop['admin_id'], is_admin=True)
+
+
+def add_item(client, name, data):
+    form = {'name': name, 'description': '', 'price': '10', 'shift': 'lunch',
+            'image': (io.BytesIO(data), 'photo.png')}
+    assert client.post('/admin/menu/add', data=form, content_type='multipart/form-data').get_json()['success']
+    with app.app_context():
+        item = MenuItem.query.filter_by(name=name).one()
+        return item.id, item.image_path
+
+
+def test_shared_upload_is_kept_until_last_item_is_deleted(upload_root, admin_client):
+    data = png_bytes()
+    first_id, image_path = add_item(admin_client, 'First', data)
+    second_id, second_path = add_item(admin_client, 'Second', data)
+    assert second_path == image_path
+    full_path = upload_root / image_path
+
+    assert admin_client.delete(f'/admin/menu/{first_id}').get_json()['success']
+    assert full_path.exists()
+
+    # Replacing the image on the last referencing item releases the old file
+    form = {'name': 'Second', 'description': '', 'price': '10', 'shift': 'lunch',
+            'image': (io.BytesIO(png_bytes(color=(0, 255, 0, 255))), 'photo.png')}
+    assert admin_client.put(f'/admin/menu/{second_id}', data=form,
+                            content_type='multipart/form-data').get_json()['success']
+    assert not full_path.exists()
+    assert not (upload_root / image_path.replace('.png', '_card.jpg')).exists()
+
+
+def test_failed_commit_removes_the_new_upload(upload_root, admin_client, monkeypatch):
+    data = png_bytes()
+    kept_id, kept_path = add_item(admin_client, 'Kept', data)
+
+    def fail():
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    form = {'name': 'Lost', 'description': '', 'price': '10', 'shift': 'lunch',
+            'image': (io.BytesIO(png_bytes(color=(0, 0, 255, 255))), 'photo.png')}
+    assert not admin_client.post('/admin/menu/add', data=form,
+                                 content_type='multipart/form-data').get_json()['success']
+    # The same image as a committed item stays for that item
+    form['image'] = (io.BytesIO(data), 'photo.png')
+    assert not admin_client.post('/admin/menu/add', data=form,
+                                 content_type='multipart/form-data').get_json()['success']
+    assert sorted(name for name in os.listdir(upload_root / 'static' / 'uploads') if name.endswith('.png')) == \
+        [os.path.basename(kept_path)]
+
+
+def test_backfilled_variants_reach_the_cached_menu(upload_root, admin_client):
+    (upload_root / 'static' / 'uploads' / 'legacy.png').write_bytes(png_bytes())
+    with app.app_context():
+        db.session.add(MenuItem(name='Legacy', description='', price=10, shift='lunch',
+                                image_path='static/uploads/legacy.png'))
+        db.session.commit()
+
+    def menu_image():
+        items = admin_client.get('/api/menu').get_json()['items']
+        return next(item['image']['src'] for item in items if item['name'] == 'Legacy')
+
+    assert menu_image() == '/static/uploads/legacy.png'
+    # The backfill runs in another process, so this one still remembers the missing variants
+    missing = dict(_image_variant_cache)
+    with app.app_context():
+        assert generate_missing_image_variants() == 1
+    _image_variant_cache.update(missing)
+    assert menu_image() == '/static/uploads/legacy_card.jpg'
+
+
+def test_hashed_uploads_are_served_immutable(upload_root, admin_client, monkeypatch):
+    monkeypatch.setattr(app, 'static_folder', str(upload_root / 'static'))
+    digest = hashlib.sha256(png_bytes()).hexdigest()
+    save_uploaded_image(FakeUpload('dish.png', png_bytes()))
+    response = admin_client.get(f'/static/uploads/{digest}_card.jpg')
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == app.config['UPLOAD_CACHE_MAX_AGE']
+    assert response.get_etag() == (f'{digest}_card', False)
+
+    response = admin_client.get(f'/static/uploads/{digest}_card.jpg',
+                                headers={'If-None-Match': f'"{digest}_card"'})
+    assert response.status_code == 304
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Menu API tests: /api/menu serves pre-serialized JSON per locale and data
+version, honours If-None-Match and filters by meal shift.
+"""
+
+import pytest
+
+from app import app, db, MenuItem, _menu_api_cache, record_rating
+from conftest import client_for, count_queries
+
+
+@pytest.fixture
+def menu(shop):
+    """The shop's Khichuri with one rating, a breakfast item and an unavailable one."""
+    with app.app_context():
+        db.session.add_all([
+            MenuItem(name='Paratha', description='', price=15, shift='breakfast'),
+            MenuItem(name='Biryani', description='', price=120, shift='lunch', available=False),
+        ])
+        record_rating(shop['item_id'], 4)
+        db.session.commit()
+    return shop
+
+
+def test_lists_available_items_with_ratings(menu):
+    data = app.test_client().get('/api/menu').get_json()
+    assert [item['name'] for item in data['items']] == ['Khichuri', 'Paratha']
+    khichuri = data['items'][0]
+    assert khichuri['rating'] == {'average': 4.0, 'count': 1}
+    assert khichuri['image']['src'] == '/static/uploads/default-food.png'
+    assert data['locale'] == 'en'
+
+
+def test_filters_by_shift(menu):
+    client = app.test_client()
+    data = client.get('/api/menu?shift=breakfast').get_json()
+    assert [item['name'] for item in data['items']] == ['Paratha']
+    assert client.get('/api/menu?shift=brunch').status_code == 400
+
+
+def test_repeat_requests_are_served_from_memory_and_validated(menu):
+    client = app.test_client()
+    first = client.get('/api/menu')
+    with count_queries() as counter:
+        second = client.get('/api/menu')
+        not_modified = client.get('/api/menu', headers={'If-None-Match': first.headers['ETag']})
+    assert second.data == first.data
+    assert not_modified.status_code == 304
+    # One data version lookup per request, no menu queries
+    assert counter.count == 2, "\n".join(counter.statements)
+
+
+def test_menu_writes_change_the_payload(menu):
+    client = app.test_client()
+    etag = client.get('/api/menu').headers['ETag']
+    client_for(menu['admin_id'], is_admin=True).post(f"/admin/menu/{menu['item_id']}/toggle")
+    response = client.get('/api/menu', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [item['name'] for item in response.get_json()['items']] == ['Paratha']
+
+
+def test_cached_per_locale(menu):
+    client = app.test_client()
+    english = client.get('/api/menu', headers={'Accept-Language': 'en'}).get_json()
+    bangla = client.get('/api/menu', headers={'Accept-Language': 'bn'}).get_json()
+    assert (english['locale'], bangla['locale']) == ('en', 'bn')
+    assert bangla['labels']['add_to_cart'] != english['labels']['add_to_cart']
+
+
+def test_unknown_languages_add_no_cache_entries(menu):
+    for n in range(50):
+        response = app.test_client().get(f'/api/menu?lang=zz{n}')
+        assert response.status_code == 200
+    assert set(_menu_api_cache) == {(app.config['BABEL_DEFAULT_LOCALE'], None)}
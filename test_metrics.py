@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Request metrics tests: per-endpoint histograms for latency, SQL statements,
+DB time and template time, exported at /admin/metrics in Prometheus format.
+"""
+
+import re
+
+import pytest
+
+from app import app, request_metrics
+from conftest import client_for
+
+
+@pytest.fixture
+def seeded(shop):
+    request_metrics.reset()
+    yield shop
+    app.config['METRICS_TOKEN'] = None
+
+
+def samples(text):
+    """{'name{labels}': value} for every sample line of an exposition."""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def test_metrics_are_admin_only(seeded):
+    response = app.test_client().get('/admin/metrics')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert app.test_client().get('/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 302
+    response = app.test_client().get('/admin/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+
+
+def test_requests_are_recorded_per_endpoint(seeded):
+    client = client_for(seeded['admin_id'], is_admin=True)
+    for _ in range(3):
+        assert client.get('/menu').status_code == 200
+    client.get('/no-such-page')
+
+    response = client.get('/admin/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    values = samples(text)
+
+    assert values['canteen_http_requests_total{endpoint="menu",method="GET",status="200"}'] == 3
+    assert values['canteen_http_requests_total{endpoint="unmatched",method="GET",status="404"}'] == 1
+    assert values['canteen_http_request_duration_seconds_count{endpoint="menu"}'] == 3
+    assert values['canteen_http_request_duration_seconds_bucket{endpoint="menu",le="+Inf"}'] == 3
+    assert values['canteen_http_request_duration_seconds_sum{endpoint="menu"}'] > 0
+    # The first request rendered the menu and queried it; the next two hit the page cache
+    assert values['canteen_db_queries_per_request_sum{endpoint="menu"}'] >= 3
+    assert values['canteen_db_duration_seconds_sum{endpoint="menu"}'] > 0
+    assert values['canteen_template_render_duration_seconds_sum{endpoint="menu"}'] > 0
+    assert '# TYPE canteen_db_queries_per_request histogram' in text
+
+
+@pytest.mark.parametrize('propagate', [False, True])
+def test_server_errors_are_recorded(seeded, monkeypatch, propagate):
+    def broken_view():
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(app.view_functions, 'view_notices', broken_view)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', propagate)
+    client = client_for(seeded['admin_id'], is_admin=True)
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get('/notices')
+    else:
+        assert client.get('/notices').status_code == 500
+
+    values = samples(client.get('/admin/metrics').get_data(as_text=True))
+    assert values['canteen_http_requests_total{endpoint="view_notices",method="GET",status="500"}'] == 1
+    assert values['canteen_http_request_duration_seconds_count{endpoint="view_notices"}'] == 1
+
+
+def test_histogram_buckets_are_cumulative(seeded):
+    client = client_for(seeded['admin_id'], is_admin=True)
+    for _ in range(4):
+        client.get('/menu')
+    values = samples(client.get('/admin/metrics').get_data(as_text=True))
+    buckets = [(float(match.group(1)) if match.group(1) != '+Inf' else float('inf'), value)
+               for key, value in values.items()
+               for match in [re.match(r'canteen_db_queries_per_request_bucket\{endpoint="menu",le="([^"]+)"\}', key)]
+               if match]
+    counts = [value for _, value in sorted(buckets)]
+    assert counts == sorted(counts)
+    assert counts[-1] == 4
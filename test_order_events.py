@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Order event stream tests: checkout, cancellation and status updates are stored
+as order events and reach the customer's and the admins' Server-Sent Events
+streams, whether streams stay open or each request replays what was missed.
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (app, db, User, Cart, Order, OrderEvent, order_events, order_event_relay, order_streams_stay_open,
+                 prune_order_events)
+from conftest import client_for
+
+
+@pytest.fixture
+def clients(shop):
+    """Admin and customer clients; the customer has two Khichuri in the cart."""
+    with app.app_context():
+        db.session.add(Cart(user_id=shop['customer_id'], item_id=shop['item_id'], quantity=2))
+        db.session.commit()
+    return {'admin': client_for(shop['admin_id'], is_admin=True), 'customer': client_for(shop['customer_id']),
+            'customer_id': shop['customer_id']}
+
+
+@pytest.fixture
+def streaming(clients, monkeypatch):
+    """Streams stay open, as under a gevent worker, and the relay polls quickly."""
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_KEEP_OPEN', True)
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_POLL_INTERVAL', 0.01)
+    yield clients
+    # The next test recreates the schema, and with it the event ids
+    while order_event_relay.is_running():
+        time.sleep(0.01)
+
+
+def parse_events(text):
+    """[(id, event, data)] for every event in an event-stream chunk; comments are skipped."""
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def open_stream(client, url):
+    response = client.get(url, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next(stream).startswith(b'retry: 5000\n\n')
+    return response, stream
+
+
+def read_event(stream):
+    _, event, data = parse_events(next(stream).decode())[0]
+    return event, data
+
+
+def test_checkout_and_status_changes_reach_customer_and_admin(streaming):
+    customer_response, customer_stream = open_stream(streaming['customer'], '/orders/events')
+    admin_response, admin_stream = open_stream(streaming['admin'], '/admin/orders/events')
+    try:
+        streaming['customer'].post('/cart/checkout')
+        event, data = read_event(customer_stream)
+        assert event == 'order_placed'
+        assert data['user_id'] == streaming['customer_id']
+        assert [order['meal_shift'] for order in data['orders']] == ['lunch']
+        assert read_event(admin_stream) == (event, data)
+
+        order_id = data['orders'][0]['order_id']
+        streaming['admin'].post(f'/admin/orders/{order_id}/status', json={'status': 'completed'})
+        event, data = read_event(customer_stream)
+        assert event == 'order_status'
+        assert (data['order_id'], data['status'], data['previous_status']) == (order_id, 'completed', 'pending')
+        assert read_event(admin_stream)[1]['status'] == 'completed'
+    finally:
+        customer_response.close()
+        admin_response.close()
+    assert order_events.subscriber_count() == 0
+
+
+def test_events_from_other_worker_processes_are_relayed(streaming):
+    response, stream = open_stream(streaming['admin'], '/admin/orders/events')
+    try:
+        # Another worker process commits through its own connection
+        connection = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+        with connection:
+            connection.execute('INSERT INTO order_event (user_id, event, data, timestamp) VALUES (?, ?, ?, ?)',
+                               (streaming['customer_id'], 'order_status', '{"order_id": 7}', datetime.utcnow()))
+        connection.close()
+        assert read_event(stream) == ('order_status', {'order_id': 7})
+    finally:
+        response.close()
+
+
+def test_customers_only_see_their_own_orders(streaming, monkeypatch):
+    with app.app_context():
+        other = User(username='other', password='x')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_HEARTBEAT', 0.05)
+    response, stream = open_stream(client_for(other_id), '/orders/events')
+    try:
+        streaming['customer'].post('/cart/checkout')
+        with app.app_context():
+            order_id = Order.query.filter_by(user_id=streaming['customer_id']).one().id
+        streaming['customer'].post(f'/orders/{order_id}/cancel')
+        assert next(stream) == b': keep-alive\n\n'
+    finally:
+        response.close()
+
+
+def test_reconnects_replay_missed_events(clients, monkeypatch):
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_KEEP_OPEN', False)
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_REPLAY', 1)
+    customer, admin = clients['customer'], clients['admin']
+    # A fresh page only learns where the event log is; nothing stays open
+    response = customer.get('/orders/events')
+    assert response.get_data(as_text=True) == 'retry: 5000\n\nid: 0\n\n'
+    assert order_events.subscriber_count() == 0
+
+    customer.post('/cart/checkout')
+    with app.app_context():
+        order_id = Order.query.filter_by(user_id=clients['customer_id']).one().id
+    customer.post(f'/orders/{order_id}/cancel')
+
+    # At most ORDER_EVENTS_REPLAY per request; the next reconnect continues after the last id
+    first = parse_events(customer.get('/orders/events', headers={'Last-Event-ID': '0'}).get_data(as_text=True))
+    assert [(event_id, event) for event_id, event, _ in first] == [(1, 'order_placed')]
+    second = parse_events(customer.get('/orders/events', headers={'Last-Event-ID': '1'}).get_data(as_text=True))
+    assert [(event_id, event) for event_id, event, _ in second] == [(2, 'order_status')]
+    assert second[0][2]['status'] == 'cancelled'
+    assert customer.get('/orders/events', headers={'Last-Event-ID': '2'}).get_data(as_text=True).endswith('id: 2\n\n')
+
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_REPLAY', 100)
+    admin_events = parse_events(admin.get('/admin/orders/events', headers={'Last-Event-ID': '0'}).get_data(as_text=True))
+    assert [event for _, event, _ in admin_events] == ['order_placed', 'order_status']
+    with app.app_context():
+        stranger = User(username='stranger', password='x')
+        db.session.add(stranger)
+        db.session.commit()
+        stranger_id = stranger.id
+    assert parse_events(client_for(stranger_id).get('/orders/events', headers={'Last-Event-ID': '0'})
+                        .get_data(as_text=True)) == []
+
+
+def test_streams_stay_open_only_under_gevent(clients):
+    # No gevent worker here: each request answers and ends instead of holding its thread
+    assert app.config['ORDER_EVENTS_KEEP_OPEN'] is None
+    assert not order_streams_stay_open()
+    response = clients['customer'].get('/orders/events', buffered=False)
+    assert order_events.subscriber_count() == 0
+    assert response.get_data(as_text=True) == 'retry: 5000\n\nid: 0\n\n'
+    assert not order_event_relay.is_running()
+
+
+def test_open_streams_are_limited(streaming, monkeypatch):
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_MAX_SUBSCRIBERS', 2)
+    first, _ = open_stream(streaming['customer'], '/orders/events')
+    second, _ = open_stream(streaming['admin'], '/admin/orders/events')
+    try:
+        refused = streaming['admin'].get('/admin/orders/events')
+        assert refused.status_code == 503
+        assert refused.headers['Retry-After']
+    finally:
+        first.close()
+        second.close()
+    assert order_events.subscriber_count() == 0
+    response, _ = open_stream(streaming['admin'], '/admin/orders/events')
+    response.close()
+
+
+def test_idle_streams_end(streaming, monkeypatch):
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_HEARTBEAT', 0.01)
+    monkeypatch.setitem(app.config, 'ORDER_EVENTS_IDLE_TIMEOUT', 0.05)
+    response, stream = open_stream(streaming['customer'], '/orders/events')
+    # Keep-alive comments don't count as activity, so the stream runs out
+    assert set(stream) == {b': keep-alive\n\n'}
+    response.close()
+    assert order_events.subscriber_count() == 0
+
+
+def test_old_events_are_pruned(clients):
+    clients['customer'].post('/cart/checkout')
+    with app.app_context():
+        OrderEvent.query.update({'timestamp': datetime.utcnow() - timedelta(hours=25)})
+        db.session.add(OrderEvent(user_id=clients['customer_id'], event='order_status', data='{}'))
+        db.session.commit()
+        assert prune_order_events() == 1
+        assert [event.event for event in OrderEvent.query] == ['order_status']
+
+
+def test_stream_requires_login():
+    assert app.test_client().get('/orders/events').status_code == 302
+    assert app.test_client().get('/admin/orders/events').status_code == 302
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Page fragment cache tests: cached pages skip their queries until a write
+bumps the data version they were rendered from.
+"""
+
+import pytest
+
+from app import app, db, Notice, _fragment_cache
+from conftest import client_for, count_queries
+
+
+@pytest.fixture
+def site(shop):
+    with app.app_context():
+        db.session.add(Notice(title='Closed Friday', content='Holiday'))
+        db.session.commit()
+    # Requests must not share the fixture's app context, or g would carry over
+    return {'admin': client_for(shop['admin_id'], is_admin=True), 'customer': client_for(shop['customer_id']),
+            'item_id': shop['item_id']}
+
+
+@pytest.mark.parametrize('url', ['/', '/menu', '/notices'])
+def test_second_visit_only_reads_data_versions(site, url):
+    client = site['customer']
+    first = client.get(url).data
+    with count_queries() as counter:
+        second = client.get(url).data
+    assert second == first
+    assert counter.count == 1, "\n".join(counter.statements)
+
+
+def test_menu_writes_invalidate_cached_pages(site):
+    customer, admin = site['customer'], site['admin']
+    assert b'Khichuri' in customer.get('/menu').data
+
+    assert b'Khichuri' not in customer.get('/').data
+
+    customer.post(f"/feedback/{site['item_id']}", json={'rating': 5})
+    assert b'1 reviews' in customer.get('/menu').data
+    assert b'Khichuri' in customer.get('/').data
+
+    admin.post(f"/admin/menu/{site['item_id']}/toggle")
+    assert b'Not Available' in customer.get('/menu').data
+    assert b'Khichuri' not in customer.get('/').data
+
+
+def test_notice_writes_invalidate_cached_pages(site):
+    customer, admin = site['customer'], site['admin']
+    assert b'Closed Friday' in customer.get('/notices').data
+
+    admin.post('/admin/notices/add', data={'title': 'Biryani day', 'content': 'Wednesday'})
+    assert b'Biryani day' in customer.get('/notices').data
+    assert b'Biryani day' in customer.get('/').data
+
+    with app.app_context():
+        notice_id = Notice.query.filter_by(title='Biryani day').one().id
+    admin.post(f'/admin/notices/{notice_id}/delete')
+    assert b'Biryani day' not in customer.get('/notices').data
+
+
+def test_pages_are_cached_per_locale(site):
+    site['customer'].get('/menu', headers={'Accept-Language': 'en'})
+    site['customer'].get('/menu', headers={'Accept-Language': 'bn'})
+    assert {locale for template, locale in _fragment_cache if template == 'menu.html'} == {'en', 'bn'}
+
+
+def test_unknown_languages_add_no_cache_entries(site):
+    for n in range(50):
+        # A fresh visitor each time, so nothing is remembered in the session
+        response = app.test_client().get(f'/menu?lang=zz{n}')
+        assert response.status_code == 200
+    assert set(_fragment_cache) == {('menu.html', app.config['BABEL_DEFAULT_LOCALE'])}
+
+
+@pytest.mark.parametrize('url', ['/', '/menu', '/notices'])
+def test_unchanged_page_answers_not_modified(site, url):
+    client = site['customer']
+    etag = client.get(url).headers['ETag']
+    assert 'private' in client.get(url).headers['Cache-Control']
+    with count_queries() as counter:
+        response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert counter.count == 1, "\n".join(counter.statements)
+
+
+def test_page_validator_changes_with_data_and_visitor(site):
+    customer, admin = site['customer'], site['admin']
+    etag = customer.get('/menu').headers['ETag']
+
+    # The cart badge is part of the page
+    customer.post('/cart/batch', json={'operations': [{'item_id': site['item_id'], 'delta': 1}]})
+    response = customer.get('/menu', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    admin.post(f"/admin/menu/{site['item_id']}/toggle")
+    assert customer.get('/menu', headers={'If-None-Match': etag}).status_code == 200
+    assert customer.get('/menu', headers={'If-None-Match': etag, 'Accept-Language': 'bn'}).status_code == 200
+
+
+def test_pages_with_flash_messages_are_not_validated(site):
+    client = site['customer']
+    etag = client.get('/notices').headers['ETag']
+    with client.session_transaction() as sess:
+        sess['_flashes'] = [('message', 'Order placed successfully!')]
+    response = client.get('/notices', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Order placed successfully!' in response.data
+    assert 'ETag' not in response.headers
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Password hashing tests: hashes run in the bounded pool, old hashes are
+upgraded on login and a full queue turns logins away instead of piling up.
+"""
+
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import app as canteen
+from app import app, db, User
+
+
+@pytest.fixture
+def student(fresh_db):
+    with app.app_context():
+        db.session.add(User(username='student', password=generate_password_hash('secret', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+
+
+def stored_hash():
+    with app.app_context():
+        return User.query.filter_by(username='student').one().password
+
+
+def login(client, password='secret'):
+    return client.post('/login', data={'username': 'student', 'password': password})
+
+
+def test_register_hashes_with_configured_parameters(student):
+    client = app.test_client()
+    client.post('/register', data={'username': 'new', 'password': 'pw', 'confirm_password': 'pw'})
+    with app.app_context():
+        pwhash = User.query.filter_by(username='new').one().password
+    assert pwhash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not canteen.password_needs_rehash(pwhash)
+
+
+def test_login_upgrades_outdated_hash(student):
+    assert canteen.password_needs_rehash(stored_hash())
+    assert login(app.test_client()).status_code == 302
+    pwhash = stored_hash()
+    assert not canteen.password_needs_rehash(pwhash)
+    assert check_password_hash(pwhash, 'secret')
+
+
+def test_failed_login_keeps_hash(student):
+    before = stored_hash()
+    assert login(app.test_client(), 'wrong').status_code == 200
+    assert stored_hash() == before
+
+
+def test_hashing_runs_in_the_pool(student):
+    threads = set()
+    original = canteen.check_password_hash
+
+    def recording_check(pwhash, password):
+        threads.add(threading.current_thread().name)
+        return original(pwhash, password)
+
+    canteen.check_password_hash = recording_check
+    try:
+        login(app.test_client())
+    finally:
+        canteen.check_password_hash = original
+    assert threads and all(name.startswith('password-hash') for name in threads)
+
+
+def test_full_queue_rejects_login(student, monkeypatch):
+    monkeypatch.setattr(canteen, '_password_slots', threading.BoundedSemaphore(1))
+    canteen._password_slots.acquire()
+    response = login(app.test_client())
+    assert response.status_code == 503
+    assert b'Too many people are signing in' in response.data
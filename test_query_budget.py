@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Query budget tests: count the SQL statements each route issues and fail
+when a route goes over its declared budget (usually an N+1 lazy load), or
+when SQLite's EXPLAIN QUERY PLAN shows one of them scanning a whole table.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import (app, db, User, MenuItem, Order, OrderItem, Cart, Feedback, Notice, record_rating, load_identity)
+from conftest import client_for, count_queries
+
+# Maximum number of SQL statements per request. These must not depend on how
+# many orders, order items or cart rows the seeded user has. Cached pages are
+# measured on a cache miss, including the data version lookup; the user's
+# identity is already cached, as it is after their first request.
+QUERY_BUDGETS = {
+    'index': 4,
+    'menu': 3,
+    'view_notices': 3,
+    'view_orders': 3,
+    'view_cart': 2,
+    'profile': 5,
+    'admin_dashboard': 6,
+    'admin_orders': 3,
+    'admin_profile': 6,
+    'remove_from_cart': 3,
+    'batch_update_cart': 4,
+    # One INSERT per meal shift where the database has no RETURNING (SQLite),
+    # plus the rollup, all-time total and customer counter upserts and the order event
+    'checkout': 14,
+}
+
+# Tables that are read in full on purpose; scanning anything else means a missing index
+FULL_SCAN_ALLOWED = {'menu_item', 'rating_summary', 'data_version', 'sales_total'}
+
+MENU_ITEMS = 12
+ORDERS_PER_USER = 6
+ITEMS_PER_ORDER = 4
+
+
+def full_table_scans(counter):
+    """(table, statement) for every plan step that reads a whole table without an index."""
+    scans = []
+    with app.app_context():
+        connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement, parameters, executemany in counter.executions:
+            if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall():
+                match = re.match(r'SCAN (?:TABLE )?"?(\w+)"?', row[-1])
+                if match and 'INDEX' not in row[-1] and match.group(1) not in FULL_SCAN_ALLOWED:
+                    scans.append((match.group(1), statement))
+    finally:
+        connection.close()
+    return scans
+
+
+def assert_within_budget(endpoint, counter):
+    budget = QUERY_BUDGETS[endpoint]
+    assert counter.count <= budget, (
+        f"{endpoint} issued {counter.count} queries (budget {budget}):\n" + "\n".join(counter.statements)
+    )
+    scans = full_table_scans(counter)
+    assert not scans, f"{endpoint} scans whole tables:\n" + "\n".join(
+        f"{table}: {statement}" for table, statement in scans
+    )
+
+
+@pytest.fixture
+def seeded(fresh_db):
+    """Fresh schema with enough rows that any per-row lazy load blows the budget."""
+    with app.app_context():
+        admin = User(username='admin', password='x', is_admin=True)
+        customer = User(username='customer', password='x')
+        db.session.add_all([admin, customer])
+        items = [
+            MenuItem(name=f'Item {i}', description='', price=10 + i, shift=shift, image_path=f'static/uploads/{i}.png')
+            for i, shift in zip(range(MENU_ITEMS), ['breakfast', 'lunch', 'dinner', 'supper'] * MENU_ITEMS)
+        ]
+        db.session.add_all(items)
+        db.session.add(Notice(title='Notice', content='Content'))
+        db.session.flush()
+
+        now = datetime.utcnow()
+        for n in range(ORDERS_PER_USER):
+            order = Order(user_id=customer.id, meal_shift='lunch', status='completed',
+                          timestamp=now - timedelta(hours=n), total_amount=0)
+            db.session.add(order)
+            db.session.flush()
+            # Rotate through the menu so each order references different items
+            for k in range(ITEMS_PER_ORDER):
+                item = items[(n * ITEMS_PER_ORDER + k) % MENU_ITEMS]
+                db.session.add(OrderItem(order_id=order.id, item_id=item.id, quantity=1, unit_price=item.price))
+                order.total_amount += item.price
+        for item in items:
+            db.session.add(Cart(user_id=customer.id, item_id=item.id, quantity=2))
+            db.session.add(Feedback(user_id=customer.id, item_id=item.id, rating=5))
+            record_rating(item.id, 5)
+        db.session.commit()
+        # Budgets assume the identity cache already holds both users
+        load_identity(admin.id)
+        load_identity(customer.id)
+        yield {'admin_id': admin.id, 'customer_id': customer.id}
+
+
+@pytest.mark.parametrize('endpoint,url', [
+    ('index', '/'),
+    ('menu', '/menu'),
+    ('view_notices', '/notices'),
+    ('view_orders', '/orders'),
+    ('view_cart', '/cart'),
+    ('profile', '/profile'),
+])
+def test_customer_pages_within_budget(seeded, endpoint, url):
+    client = client_for(seeded['customer_id'])
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert_within_budget(endpoint, counter)
+
+
+@pytest.mark.parametrize('endpoint,url', [
+    ('admin_dashboard', '/admin/dashboard'),
+    ('admin_orders', '/admin/orders'),
+    ('admin_profile', '/admin/profile'),
+])
+def test_admin_pages_within_budget(seeded, endpoint, url):
+    client = client_for(seeded['admin_id'], is_admin=True)
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert_within_budget(endpoint, counter)
+
+
+def test_remove_from_cart_within_budget(seeded):
+    client = client_for(seeded['customer_id'])
+    with app.app_context():
+        cart_id = Cart.query.filter_by(user_id=seeded['customer_id']).first().id
+    with count_queries() as counter:
+        response = client.post(f'/cart/remove/{cart_id}', headers={'Accept': 'application/json'})
+    assert response.get_json()['success']
+    assert_within_budget('remove_from_cart', counter)
+
+
+def test_checkout_within_budget(seeded):
+    client = client_for(seeded['customer_id'])
+    with count_queries() as counter:
+        response = client.post('/cart/checkout')
+    assert response.status_code == 302
+    assert_within_budget('checkout', counter)
+    with app.app_context():
+        assert Cart.query.filter_by(user_id=seeded['customer_id']).count() == 0
+        placed = Order.query.filter_by(user_id=seeded['customer_id'], status='pending').all()
+        # The seeded cart holds every menu item across four meal shifts
+        assert len(placed) == 4
+        for order in placed:
+            assert order.total_amount == sum(line.quantity * line.unit_price for line in order.order_items)
+
+
+def test_simultaneous_checkouts_keep_their_own_lines(seeded, monkeypatch):
+    """A double submit in the same instant must not mix the two batches' order lines."""
+    placed_at = datetime.utcnow()
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return placed_at
+
+    monkeypatch.setattr(app_module, 'datetime', FrozenDatetime)
+    client = client_for(seeded['customer_id'])
+    assert client.post('/cart/checkout').status_code == 302
+    with app.app_context():
+        item = MenuItem.query.filter_by(shift='lunch').first()
+        price = item.price
+        db.session.add(Cart(user_id=seeded['customer_id'], item_id=item.id, quantity=1))
+        db.session.commit()
+    assert client.post('/cart/checkout').status_code == 302
+
+    with app.app_context():
+        placed = Order.query.filter_by(user_id=seeded['customer_id'], status='pending').order_by(Order.id).all()
+        assert len(placed) == 5
+        assert [len(order.order_items) for order in placed if order.meal_shift == 'lunch'] == [3, 1]
+        assert placed[-1].total_amount == price
+
+
+def test_cart_badge_count_is_cached_in_session(seeded):
+    client = client_for(seeded['customer_id'])
+    with count_queries() as first:
+        client.get('/orders')
+    with count_queries() as second:
+        client.get('/orders')
+    assert second.count == first.count - 1
+
+    with app.app_context():
+        cart_id = Cart.query.filter_by(user_id=seeded['customer_id']).first().id
+    response = client.post(f'/cart/remove/{cart_id}', headers={'Accept': 'application/json'})
+    assert response.get_json()['cart_count'] == MENU_ITEMS - 1
+    client.post('/cart/clear')
+    with client.session_transaction() as sess:
+        assert sess['cart_count'] == 0
+
+
+def test_batch_cart_update_is_one_round_trip(seeded):
+    client = client_for(seeded['customer_id'])
+    with app.app_context():
+        first, second = [item.id for item in MenuItem.query.order_by(MenuItem.id).limit(2)]
+    client.post('/cart/clear')
+    operations = [
+        {'item_id': first, 'delta': 1},
+        {'item_id': first, 'delta': 1},
+        {'item_id': second, 'delta': 3},
+    ]
+    with count_queries() as counter:
+        response = client.post('/cart/batch', json={'operations': operations})
+    assert_within_budget('batch_update_cart', counter)
+    data = response.get_json()
+    assert data['cart_count'] == 2
+    assert {item['item_id']: item['quantity'] for item in data['items']} == {first: 2, second: 3}
+
+    response = client.post('/cart/batch', json={'operations': [
+        {'item_id': first, 'delta': 1},
+        {'item_id': second, 'delta': -3},
+    ]})
+    data = response.get_json()
+    assert data['cart_count'] == 1
+    assert data['items'][0]['quantity'] == 3
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Rating summary tests: every posted rating is folded into its item's running
+totals and star histogram, and rebuilding from Feedback gives the same rows.
+"""
+
+import pytest
+
+from app import app, db, User, MenuItem, Feedback, RatingSummary, rebuild_rating_summaries
+from conftest import client_for
+
+
+@pytest.fixture
+def menu(shop):
+    """The shop's Khichuri, a Biryani and a second customer to rate them."""
+    with app.app_context():
+        second = User(username='second', password='x')
+        biryani = MenuItem(name='Biryani', description='', price=150, shift='dinner')
+        db.session.add_all([second, biryani])
+        db.session.commit()
+        ids = dict(shop, user_ids=[shop['customer_id'], second.id], khichuri_id=shop['item_id'], biryani_id=biryani.id)
+    return ids
+
+
+def summaries():
+    with app.app_context():
+        return {row.item_id: (row.rating_sum, row.rating_count, row.histogram) for row in RatingSummary.query}
+
+
+def feedback_totals():
+    """What the summaries should hold, counted straight from Feedback."""
+    totals = {}
+    with app.app_context():
+        for feedback in Feedback.query:
+            rating_sum, rating_count, histogram = totals.get(feedback.item_id, (0, 0, [0] * 5))
+            histogram = list(histogram)
+            histogram[feedback.rating - 1] += 1
+            totals[feedback.item_id] = (rating_sum + feedback.rating, rating_count + 1, histogram)
+    return totals
+
+
+def test_ratings_fill_the_histogram_and_rebuild_matches(menu):
+    first, second = (client_for(user_id) for user_id in menu['user_ids'])
+    for client, item_id, rating in [(first, menu['khichuri_id'], 5), (second, menu['khichuri_id'], 4),
+                                    (first, menu['khichuri_id'], 5), (second, menu['biryani_id'], 1)]:
+        assert client.post(f'/feedback/{item_id}', json={'rating': rating}).get_json() == {'success': True}
+    # Form posts count the same way; out-of-range ratings are not counted at all
+    first.post(f"/feedback/{menu['biryani_id']}", data={'rating': '3', 'comment': 'ok'})
+    assert not second.post(f"/feedback/{menu['biryani_id']}", json={'rating': 6}).get_json()['success']
+
+    incremental = summaries()
+    assert incremental == {
+        menu['khichuri_id']: (14, 3, [0, 0, 0, 1, 2]),
+        menu['biryani_id']: (4, 2, [1, 0, 1, 0, 0]),
+    }
+    assert incremental == feedback_totals()
+    with app.app_context():
+        assert RatingSummary.query.get(menu['khichuri_id']).average == 4.7
+
+    with app.app_context():
+        assert rebuild_rating_summaries() == 2
+    assert summaries() == incremental
+
+
+def test_rebuild_repairs_drifted_summaries(menu):
+    client = client_for(menu['user_ids'][0])
+    client.post(f"/feedback/{menu['khichuri_id']}", json={'rating': 2})
+    with app.app_context():
+        RatingSummary.query.update({'rating_count': 7, 'stars_5': 3})
+        db.session.commit()
+        rebuild_rating_summaries()
+    assert summaries() == {menu['khichuri_id']: (2, 1, [0, 1, 0, 0, 0])}
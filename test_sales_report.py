@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Sales report tests: /admin/reports/sales buckets the rollups by day or week and
+meal shift, serves repeated requests from its cache, and recomputes only the
+days that changed since. The dashboard's all-time totals follow every order.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import (app, db, MenuItem, Order, OrderItem, Cart, SalesTotal, ItemSalesTotal, rebuild_sales_rollups,
+                 _sales_day_cache, _sales_report_cache)
+from conftest import client_for, count_queries
+
+# A Monday, so week buckets start on it
+MONDAY = date(2026, 9, 7)
+
+
+@pytest.fixture
+def sales(shop):
+    """Orders on four days of two weeks, in two shifts and every status."""
+    with app.app_context():
+        lunch = MenuItem.query.get(shop['item_id'])
+        dinner = MenuItem(name='Biryani', description='', price=150, shift='dinner')
+        db.session.add(dinner)
+        db.session.flush()
+        orders = {}
+        for days, item, quantity, status in [(0, lunch, 2, 'completed'), (0, dinner, 1, 'pending'),
+                                             (1, lunch, 3, 'cancelled'), (2, dinner, 2, 'completed'),
+                                             (8, lunch, 1, 'completed')]:
+            order = Order(user_id=shop['customer_id'], meal_shift=item.shift, status=status,
+                          timestamp=datetime.combine(MONDAY + timedelta(days=days), datetime.min.time()) + timedelta(hours=12),
+                          total_amount=quantity * item.price)
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, item_id=item.id, quantity=quantity, unit_price=item.price))
+            orders[(days, item.shift)] = order.id
+        db.session.commit()
+        rebuild_sales_rollups()
+    return dict(shop, orders=orders)
+
+
+def report(client, **params):
+    response = client.get('/admin/reports/sales', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_report_is_admin_only(sales):
+    response = client_for(sales['customer_id']).get('/admin/reports/sales')
+    assert response.status_code == 302
+
+
+def test_day_buckets_split_by_shift(sales):
+    client = client_for(sales['admin_id'], is_admin=True)
+    data = report(client, start=MONDAY.isoformat(), end=(MONDAY + timedelta(days=2)).isoformat())
+
+    assert [bucket['start'] for bucket in data['buckets']] == ['2026-09-07', '2026-09-08', '2026-09-09']
+    monday = data['buckets'][0]
+    assert monday['shifts']['lunch'] == {'orders': 1, 'pending': 0, 'completed': 1, 'cancelled': 0,
+                                         'revenue': 120, 'items': 2}
+    assert monday['shifts']['dinner'] == {'orders': 1, 'pending': 1, 'completed': 0, 'cancelled': 0,
+                                          'revenue': 150, 'items': 1}
+    assert monday['shifts']['breakfast']['orders'] == 0
+    assert (monday['orders'], monday['revenue'], monday['items']) == (2, 270, 3)
+    # Cancelled orders are counted but earn nothing
+    tuesday = data['buckets'][1]
+    assert (tuesday['orders'], tuesday['cancelled'], tuesday['revenue'], tuesday['items']) == (1, 1, 0, 3)
+    assert data['totals'] == {'orders': 4, 'pending': 1, 'completed': 2, 'cancelled': 1,
+                              'revenue': 570, 'items': 8}
+
+
+def test_week_buckets_cover_whole_weeks(sales):
+    client = client_for(sales['admin_id'], is_admin=True)
+    data = report(client, bucket='week', start=(MONDAY + timedelta(days=2)).isoformat(),
+                  end=(MONDAY + timedelta(days=8)).isoformat(), shift='lunch')
+
+    assert (data['start'], data['end']) == ('2026-09-07', '2026-09-20')
+    assert [(bucket['start'], bucket['end']) for bucket in data['buckets']] == [
+        ('2026-09-07', '2026-09-13'), ('2026-09-14', '2026-09-20')]
+    first, second = data['buckets']
+    assert list(first['shifts']) == ['lunch']
+    assert (first['orders'], first['revenue'], first['items']) == (2, 120, 5)
+    assert (second['orders'], second['revenue'], second['items']) == (1, 60, 1)
+
+
+def test_repeated_report_is_served_from_cache(sales):
+    client = client_for(sales['admin_id'], is_admin=True)
+    params = {'start': MONDAY.isoformat(), 'end': (MONDAY + timedelta(days=30)).isoformat()}
+    first = client.get('/admin/reports/sales', query_string=params)
+
+    with count_queries() as counter:
+        again = client.get('/admin/reports/sales', query_string=params)
+    assert again.get_data() == first.get_data()
+    # Only the day versions are read
+    assert counter.count == 1
+    assert 'sales_day_version' in counter.statements[0]
+
+    unchanged = client.get('/admin/reports/sales', query_string=params,
+                           headers={'If-None-Match': first.headers['ETag']})
+    assert unchanged.status_code == 304
+
+
+def test_only_changed_days_are_recomputed(sales):
+    client = client_for(sales['admin_id'], is_admin=True)
+    params = {'start': MONDAY.isoformat(), 'end': (MONDAY + timedelta(days=13)).isoformat()}
+    report(client, **params)
+    untouched = _sales_day_cache[MONDAY]
+
+    wednesday_order = sales['orders'][(2, 'dinner')]
+    response = client.post('/admin/orders/%d/status' % wednesday_order, json={'status': 'cancelled'})
+    assert response.get_json() == {'success': True}
+
+    with count_queries() as counter:
+        data = report(client, **params)
+    assert counter.count == 2
+    # The grouped pass only covered the changed day
+    statement, parameters, _ = counter.executions[1]
+    assert 'UNION ALL' in statement
+    assert [value for value in parameters if isinstance(value, str) and value.startswith('2026')] == \
+        ['2026-09-09'] * 4
+    assert _sales_day_cache[MONDAY] is untouched
+    assert data['buckets'][2]['cancelled'] == 1
+    assert data['buckets'][2]['revenue'] == 0
+    assert data['totals']['revenue'] == 330
+
+
+def test_day_cache_keeps_only_recent_days(sales, monkeypatch):
+    monkeypatch.setitem(app.config, 'SALES_REPORT_DAY_CACHE_SIZE', 20)
+    client = client_for(sales['admin_id'], is_admin=True)
+    first = report(client, start=MONDAY.isoformat(), end=(MONDAY + timedelta(days=13)).isoformat())
+    report(client, start='2026-01-01', end='2026-01-14')
+    assert len(_sales_day_cache) == 20
+    assert MONDAY not in _sales_day_cache
+
+    # Evicted days are simply recomputed
+    _sales_report_cache.clear()
+    assert report(client, start=MONDAY.isoformat(), end=(MONDAY + timedelta(days=13)).isoformat()) == first
+
+
+def test_checkout_updates_todays_bucket(sales):
+    client = client_for(sales['customer_id'])
+    today = datetime.utcnow().date()
+    admin = client_for(sales['admin_id'], is_admin=True)
+    before = report(admin)
+    assert before['end'] == today.isoformat()
+
+    with app.app_context():
+        db.session.add(Cart(user_id=sales['customer_id'], item_id=sales['item_id'], quantity=2))
+        db.session.commit()
+    assert client.post('/cart/checkout').status_code in (200, 302)
+
+    after = report(admin)
+    assert after['buckets'][-1]['shifts']['lunch']['items'] == 2
+    assert after['totals']['pending'] == before['totals']['pending'] + 1
+    assert after['buckets'][:-1] == before['buckets'][:-1]
+
+
+def sales_totals():
+    with app.app_context():
+        # Statuses whose orders all moved on keep an empty row until the next rebuild
+        return (sorted((row.status, row.order_count, round(row.revenue, 2)) for row in SalesTotal.query
+                       if row.order_count),
+                sorted((row.item_id, row.quantity, round(row.revenue, 2)) for row in ItemSalesTotal.query))
+
+
+def test_dashboard_totals_follow_checkout_and_status_changes(sales):
+    admin = client_for(sales['admin_id'], is_admin=True)
+    with app.app_context():
+        db.session.add(Cart(user_id=sales['customer_id'], item_id=sales['item_id'], quantity=2))
+        db.session.commit()
+    assert client_for(sales['customer_id']).post('/cart/checkout').status_code in (200, 302)
+    with app.app_context():
+        new_order = db.session.query(db.func.max(Order.id)).scalar()
+    for order_id, status in [(new_order, 'cancelled'), (sales['orders'][(0, 'dinner')], 'completed')]:
+        response = admin.post('/admin/orders/%d/status' % order_id, json={'status': status})
+        assert response.get_json() == {'success': True}
+
+    page = admin.get('/admin/dashboard').get_data(as_text=True)
+    # Six orders worth 930 in every status, and 8 Khichuri across them
+    assert '>6</h2>' in page
+    assert '৳&nbsp;930' in page
+    assert '8 sold' in page and '3 sold' in page
+    assert sales_totals()[0] == [('cancelled', 2, 300), ('completed', 4, 630)]
+
+    incremental = sales_totals()
+    with app.app_context():
+        rebuild_sales_rollups()
+    assert sales_totals() == incremental
+
+
+@pytest.mark.parametrize('params', [
+    {'bucket': 'month'},
+    {'shift': 'brunch'},
+    {'start': '2026-13-01'},
+    {'start': '2026-09-10', 'end': '2026-09-01'},
+    {'start': '2020-01-01', 'end': '2026-01-01'},
+])
+def test_invalid_parameters_are_rejected(sales, params):
+    response = client_for(sales['admin_id'], is_admin=True).get('/admin/reports/sales', query_string=params)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Slow query log tests: statements over SLOW_QUERY_THRESHOLD_MS are kept with
+their normalized SQL, parameter types, endpoint and SQLite query plan.
+"""
+
+import json
+
+import pytest
+
+from app import app, slow_queries, normalize_sql, parameter_shape
+from conftest import client_for
+
+
+@pytest.fixture
+def seeded(shop):
+    # Log every statement
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+    slow_queries.clear()
+    yield shop
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 100
+    app.config['SLOW_QUERY_LOG_FILE'] = None
+    slow_queries.clear()
+
+
+def test_normalize_sql_hides_literals():
+    statement = "SELECT *  FROM  menu_item\n WHERE name = 'Dal''s' AND price > 20 AND id IN (?, ?, ?) LIMIT 10"
+    assert normalize_sql(statement) == 'SELECT * FROM menu_item WHERE name = ? AND price > ? AND id IN (?, ...) LIMIT ?'
+    assert normalize_sql('SELECT anon_1.id FROM anon_1') == 'SELECT anon_1.id FROM anon_1'
+
+
+def test_parameter_shape_never_includes_values():
+    assert parameter_shape((7, 'secret', None)) == '(int, str, NoneType)'
+    assert parameter_shape((1, 2, 3, 4, 5)) == '(5 x int)'
+    assert parameter_shape({'name': 'secret'}) == '{name: str}'
+    assert parameter_shape([(1, 'a'), (2, 'b')], executemany=True) == '2 x (int, str)'
+
+
+def test_dashboard_query_is_logged_with_its_plan(seeded, tmp_path):
+    log_file = tmp_path / 'slow.jsonl'
+    app.config['SLOW_QUERY_LOG_FILE'] = str(log_file)
+    client = client_for(seeded['admin_id'], is_admin=True)
+    assert client.get('/admin/dashboard').status_code == 200
+
+    popular = [entry for entry in slow_queries if 'item_sales_total' in entry['sql']]
+    assert popular
+    entry = popular[0]
+    assert entry['endpoint'] == 'admin_dashboard'
+    assert entry['plan'] and any('item_sales_total' in step for step in entry['plan'])
+
+    logged = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert len(logged) == len(slow_queries)
+    assert logged[-1]['sql'] == slow_queries[-1]['sql']
+
+    page = client.get('/admin/slow-queries').get_data(as_text=True)
+    assert 'item_sales_total' in page and 'admin_dashboard' in page
+
+
+def test_log_is_bounded_and_clearable(seeded):
+    client = client_for(seeded['admin_id'], is_admin=True)
+    for _ in range(slow_queries.maxlen):
+        client.get('/admin/dashboard')
+    assert len(slow_queries) == slow_queries.maxlen
+
+    client.post('/admin/slow-queries/clear')
+    assert len(slow_queries) == 0
+
+
+def test_fast_statements_are_not_logged(seeded):
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 10000
+    client_for(seeded['admin_id'], is_admin=True).get('/admin/dashboard')
+    assert len(slow_queries) == 0
+
+
+def test_slow_query_page_is_admin_only(seeded):
+    response = app.test_client().get('/admin/slow-queries')
+    assert response.status_code == 302
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Translation tests: compiled catalogs match their sources, every language is
+loaded at startup and the locale is resolved once per request.
+"""
+
+import shutil
+
+from app import app, babel, stale_translation_catalogs, compile_translations, _fragment_cache
+
+
+def test_committed_catalogs_are_compiled():
+    with app.app_context():
+        assert stale_translation_catalogs() == []
+
+
+def test_every_language_is_preloaded():
+    cached = {code for code, domain in babel.domain_instance.cache}
+    assert cached == set(app.config['LANGUAGES'])
+
+
+def test_compile_translations_fixes_drift(tmp_path, monkeypatch):
+    source = next(iter(babel.translation_directories))
+    shutil.copytree(source, tmp_path / 'translations')
+    monkeypatch.setitem(app.config, 'BABEL_TRANSLATION_DIRECTORIES', str(tmp_path / 'translations'))
+    po_path = tmp_path / 'translations' / 'bn' / 'LC_MESSAGES' / 'messages.po'
+    po_path.write_text(po_path.read_text(encoding='utf-8') + '\nmsgid "Checkout"\nmsgstr "চেকআউট"\n', encoding='utf-8')
+    (tmp_path / 'translations' / 'en' / 'LC_MESSAGES' / 'messages.mo').unlink()
+
+    with app.app_context():
+        assert stale_translation_catalogs() == ['en', 'bn']
+        assert compile_translations() == ['en', 'bn']
+        assert stale_translation_catalogs() == []
+
+
+def test_locale_is_resolved_once_per_request(fresh_db, monkeypatch):
+    calls = []
+    selector = babel.locale_selector_func
+
+    def counting_selector():
+        calls.append(1)
+        return selector()
+
+    monkeypatch.setattr(babel, 'locale_selector_func', counting_selector)
+    response = app.test_client().get('/menu', headers={'Accept-Language': 'bn'})
+    assert response.status_code == 200
+    assert 'লগইন' in response.get_data(as_text=True)
+    assert len(calls) == 1
+
+
+def test_unknown_language_is_ignored(fresh_db):
+    client = app.test_client()
+    response = client.get('/menu?lang=xx', headers={'Accept-Language': 'en'})
+    assert response.status_code == 200
+    with client.session_transaction() as sess:
+        assert 'language' not in sess
+    assert all(locale in app.config['LANGUAGES'] for _, locale in _fragment_cache)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Per-customer order counters: checkout, cancellation and admin status changes
+keep UserStats in step with the orders, and rebuild_user_stats() reconciles.
+"""
+
+import pytest
+
+from app import app, db, MenuItem, Cart, Order, UserStats, rebuild_user_stats
+from conftest import client_for
+
+
+@pytest.fixture
+def carts(shop):
+    """The customer has two Khichuri and a dinner Biryani in the cart."""
+    with app.app_context():
+        dinner = MenuItem(name='Biryani', description='', price=150, shift='dinner')
+        db.session.add(dinner)
+        db.session.flush()
+        db.session.add_all([Cart(user_id=shop['customer_id'], item_id=shop['item_id'], quantity=2),
+                            Cart(user_id=shop['customer_id'], item_id=dinner.id, quantity=1)])
+        db.session.commit()
+    return shop
+
+
+def stats_of(user_id):
+    with app.app_context():
+        stats = UserStats.query.get(user_id)
+        return (stats.order_count, stats.pending_count, stats.completed_count,
+                stats.cancelled_count, stats.total_spent)
+
+
+def orders_by_shift(user_id):
+    with app.app_context():
+        return {order.meal_shift: order.id for order in Order.query.filter_by(user_id=user_id)}
+
+
+def test_counters_follow_order_lifecycle(carts):
+    customer = client_for(carts['customer_id'])
+    admin = client_for(carts['admin_id'], is_admin=True)
+
+    customer.post('/cart/checkout')
+    assert stats_of(carts['customer_id']) == (2, 2, 0, 0, 0)
+
+    orders = orders_by_shift(carts['customer_id'])
+    admin.post(f"/admin/orders/{orders['lunch']}/status", json={'status': 'completed'})
+    assert stats_of(carts['customer_id']) == (2, 1, 1, 0, 120)
+
+    customer.post(f"/orders/{orders['dinner']}/cancel")
+    assert stats_of(carts['customer_id']) == (2, 0, 1, 1, 120)
+
+    # Reopening a completed order takes its amount back out of total_spent
+    admin.post(f"/admin/orders/{orders['lunch']}/status", json={'status': 'pending'})
+    assert stats_of(carts['customer_id']) == (2, 1, 0, 1, 0)
+
+
+def test_profile_reads_counters(carts):
+    customer = client_for(carts['customer_id'])
+    customer.post('/cart/checkout')
+    with app.app_context():
+        UserStats.query.filter_by(user_id=carts['customer_id']).update({'total_spent': 4321})
+        db.session.commit()
+    assert '4321' in customer.get('/profile').get_data(as_text=True)
+
+
+def test_rebuild_reconciles_drift(carts):
+    customer = client_for(carts['customer_id'])
+    customer.post('/cart/checkout')
+    expected = stats_of(carts['customer_id'])
+    with app.app_context():
+        assert rebuild_user_stats() == (1, 0)
+        UserStats.query.filter_by(user_id=carts['customer_id']).update({'pending_count': 7})
+        db.session.commit()
+        assert rebuild_user_stats() == (1, 1)
+    assert stats_of(carts['customer_id']) == expected